@@ -3,7 +3,6 @@ import os
 import random
 import json
 import datetime
-import requests
 import re
 import uuid
 import traceback
@@ -11,7 +10,21 @@ import sys
 import gc
 import psutil
 import threading
-from collections import defaultdict
+import subprocess
+import sqlite3
+import zlib
+import shlex
+import hashlib
+import shutil
+import mimetypes
+import tempfile
+import heapq
+import multiprocessing
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict, OrderedDict
+from urllib.parse import urlparse, parse_qs
+from multiprocessing.connection import Listener, Client
 import aiohttp
 import asyncio
 import time
@@ -53,6 +66,13 @@ except ImportError:
     print("⚠️  PIL/Pillow not installed. GIF conversion disabled.")
     PIL_AVAILABLE = False
 
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    print("⚠️  numpy not installed. Volume/crossfade effects disabled.")
+    NUMPY_AVAILABLE = False
+
 # ============================
 # CONFIGURATION & CONSTANTS
 # ============================
@@ -102,19 +122,73 @@ ffmpeg_options = {
     'options': '-vn',
 }
 
+# Cluster: REIKA_SHARD_COUNT shard dibagi ke REIKA_CLUSTERS proses, proses ini = REIKA_CLUSTER_ID
+SHARD_COUNT = int(os.environ.get('REIKA_SHARD_COUNT', 0))  # 0 = satu koneksi gateway tanpa sharding
+CLUSTER_COUNT = max(1, int(os.environ.get('REIKA_CLUSTERS', 1)))
+CLUSTER_ID = int(os.environ.get('REIKA_CLUSTER_ID', 0))
+SHARD_IDS = [shard for shard in range(SHARD_COUNT) if shard % CLUSTER_COUNT == CLUSTER_ID] if SHARD_COUNT else None
+
+_owned_runtime_dir = None
+
+def get_runtime_dir():
+    """Direktori runtime per instance bot (socket IPC), dibuat sekali dan diwariskan ke proses cluster"""
+    global _owned_runtime_dir
+    path = os.environ.get('REIKA_RUNTIME_DIR')
+    if not path:
+        path = _owned_runtime_dir = tempfile.mkdtemp(prefix='reika-')
+        os.environ['REIKA_RUNTIME_DIR'] = path
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def cleanup_runtime_dir():
+    """Hapus direktori runtime jika dibuat oleh proses ini"""
+    if _owned_runtime_dir:
+        shutil.rmtree(_owned_runtime_dir, ignore_errors=True)
+
+def owns_guild(guild_id):
+    """True jika guild ada di shard milik proses ini"""
+    return SHARD_IDS is None or (guild_id >> 22) % SHARD_COUNT in SHARD_IDS
+
 # ============================
 # DATA MODELS
 # ============================
 
+def _intern(value):
+    """Intern string supaya judul/URL yang sama di banyak queue berbagi satu objek"""
+    return sys.intern(value) if isinstance(value, str) else value
+
 class Song:
-    __slots__ = ('title', 'url', 'duration', 'thumbnail', 'requester')
+    __slots__ = ('title', 'url', 'webpage_url', 'duration', 'thumbnail', 'requester_id')
     
     def __init__(self, data, requester):
-        self.title = data.get('title', 'Unknown Title')
-        self.url = data.get('url') or data.get('webpage_url')
-        self.duration = data.get('duration', 0)
+        self.title = _intern(data.get('title') or 'Unknown Title')
+        self.url = _intern(data.get('url') or data.get('webpage_url'))
+        # URL halaman (bukan stream) dipakai sebagai key cache resolve
+        self.webpage_url = _intern(data.get('webpage_url')) or self.url
+        self.duration = int(data.get('duration') or 0)  # Entry flat playlist bisa None/float
         self.thumbnail = data.get('thumbnail')
-        self.requester = requester
+        # Simpan ID saja, bukan objek Member
+        self.requester_id = getattr(requester, 'id', requester)
+
+    @classmethod
+    def from_entry(cls, url, title, duration, requester_id):
+        """Buat Song dari entry ringkas (snapshot) tanpa dict info yt-dlp"""
+        song = cls.__new__(cls)
+        song.title = _intern(title or 'Unknown Title')
+        song.url = song.webpage_url = _intern(url)
+        song.duration = int(duration or 0)
+        song.thumbnail = None
+        song.requester_id = requester_id
+        return song
+
+    @property
+    def requester_mention(self):
+        return f"<@{self.requester_id}>" if self.requester_id else "Unknown"
+
+    def requester_name(self, guild=None):
+        """Nama requester dari cache member guild"""
+        member = guild.get_member(self.requester_id) if guild and self.requester_id else None
+        return member.display_name if member else "Unknown"
 
     def format_duration(self):
         if self.duration == 0:
@@ -126,39 +200,1449 @@ class Song:
         return f"{minutes}:{seconds:02d}"
 
 
+class SongQueue:
+    """Queue lagu berbasis implicit treap di array paralel.
+
+    pop(0)/append O(log n), insert/pop/getitem di index mana pun O(log n),
+    sehingga rotasi loop_queue dan command move/remove tidak menyalin list.
+    """
+
+    __slots__ = ('_items', '_left', '_right', '_prio', '_size', '_free', '_root', 'version')
+
+    def __init__(self, songs=()):
+        self.version = 0  # Naik setiap queue berubah
+        self._items = []
+        self._left = []
+        self._right = []
+        self._prio = []
+        self._size = []
+        self._free = []
+        self._root = -1
+        self.extend(songs)
+
+    # ---------- node helpers ----------
+
+    def _new_node(self, song):
+        if self._free:
+            node = self._free.pop()
+            self._items[node] = song
+            self._left[node] = self._right[node] = -1
+            self._prio[node] = random.random()
+            self._size[node] = 1
+            return node
+        self._items.append(song)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._prio.append(random.random())
+        self._size.append(1)
+        return len(self._items) - 1
+
+    def _free_node(self, node):
+        self._items[node] = None
+        self._free.append(node)
+
+    def _sz(self, node):
+        return self._size[node] if node >= 0 else 0
+
+    def _update(self, node):
+        self._size[node] = 1 + self._sz(self._left[node]) + self._sz(self._right[node])
+
+    def _split(self, node, k):
+        """Pisah jadi (k elemen pertama, sisanya)"""
+        if node < 0:
+            return -1, -1
+        left = self._left[node]
+        if self._sz(left) < k:
+            a, b = self._split(self._right[node], k - self._sz(left) - 1)
+            self._right[node] = a
+            self._update(node)
+            return node, b
+        a, b = self._split(left, k)
+        self._left[node] = b
+        self._update(node)
+        return a, node
+
+    def _merge(self, a, b):
+        if a < 0:
+            return b
+        if b < 0:
+            return a
+        if self._prio[a] > self._prio[b]:
+            self._right[a] = self._merge(self._right[a], b)
+            self._update(a)
+            return a
+        self._left[b] = self._merge(a, self._left[b])
+        self._update(b)
+        return b
+
+    def _node_at(self, index):
+        node = self._root
+        while node >= 0:
+            left_size = self._sz(self._left[node])
+            if index < left_size:
+                node = self._left[node]
+            elif index == left_size:
+                return node
+            else:
+                index -= left_size + 1
+                node = self._right[node]
+        raise IndexError("queue index out of range")
+
+    def _normalize(self, index):
+        length = len(self)
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError("queue index out of range")
+        return index
+
+    # ---------- list-like API ----------
+
+    def __len__(self):
+        return self._sz(self._root)
+
+    def __bool__(self):
+        return self._root >= 0
+
+    def __iter__(self):
+        stack = []
+        node = self._root
+        while stack or node >= 0:
+            while node >= 0:
+                stack.append(node)
+                node = self._left[node]
+            node = stack.pop()
+            yield self._items[node]
+            node = self._right[node]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                result = []
+                for i, song in enumerate(self):
+                    if i >= stop:
+                        break
+                    if i >= start:
+                        result.append(song)
+                return result
+            return [self._items[self._node_at(i)] for i in range(start, stop, step)]
+        return self._items[self._node_at(self._normalize(index))]
+
+    def append(self, song):
+        self._root = self._merge(self._root, self._new_node(song))
+        self.version += 1
+
+    def _build(self, songs, lo, hi, depth):
+        """Bangun subtree seimbang dari songs[lo:hi], prioritas turun sesuai kedalaman"""
+        if lo >= hi:
+            return -1
+        mid = (lo + hi) // 2
+        node = self._new_node(songs[mid])
+        self._prio[node] = 1.0 / (depth + 1) - random.random() / ((depth + 1) * (depth + 2)) * 0.5
+        self._left[node] = self._build(songs, lo, mid, depth + 1)
+        self._right[node] = self._build(songs, mid + 1, hi, depth + 1)
+        self._update(node)
+        return node
+
+    def extend(self, songs):
+        """Tambah banyak lagu sekaligus dalam O(n)"""
+        songs = list(songs)
+        if not songs:
+            return
+        self._root = self._merge(self._root, self._build(songs, 0, len(songs), 0))
+        self.version += 1
+
+    def insert(self, index, song):
+        index = max(0, min(index if index >= 0 else len(self) + index, len(self)))
+        a, b = self._split(self._root, index)
+        self._root = self._merge(self._merge(a, self._new_node(song)), b)
+        self.version += 1
+
+    def pop(self, index=0):
+        index = self._normalize(index)
+        a, rest = self._split(self._root, index)
+        node, b = self._split(rest, 1)
+        song = self._items[node]
+        self._free_node(node)
+        self._root = self._merge(a, b)
+        self.version += 1
+        return song
+
+    def move(self, from_index, to_index):
+        """Pindahkan lagu tanpa menyalin queue"""
+        song = self.pop(from_index)
+        self.insert(to_index, song)
+        return song
+
+    def rotate(self):
+        """Pindahkan lagu paling depan ke belakang (untuk loop_queue)"""
+        song = self.pop(0)
+        self.append(song)
+        return song
+
+    def shuffle(self):
+        songs = list(self)
+        random.shuffle(songs)
+        self.clear()
+        self.extend(songs)
+
+    def clear(self):
+        self._items.clear()
+        self._left.clear()
+        self._right.clear()
+        self._prio.clear()
+        self._size.clear()
+        self._free.clear()
+        self._root = -1
+        self.version += 1
+
+
+class PlayerState(Enum):
+    IDLE = 'idle'
+    RESOLVING = 'resolving'
+    PLAYING = 'playing'
+    TRANSITIONING = 'transitioning'
+
+
+class GuildPlayer:
+    """State musik per guild dengan state machine playback eksplisit"""
+
+    __slots__ = (
+        'guild_id', 'queue', 'current_song', 'volume', 'loop', 'loop_queue',
+        'playlist_mode', 'text_channel', 'state', 'lock', 'track_token',
+        'prefetch_task', 'playlist_task', 'track_started_at', 'track_offset',
+        'reconnecting', 'crossfade', 'normalize', '_state_changed', 'state_version',
+    )
+
+    def __init__(self, guild_id, volume):
+        self.guild_id = guild_id
+        self.lock = asyncio.Lock()  # Serialisasi play_next / play_song per guild
+        self._state_changed = asyncio.Event()
+        self.state_version = 0  # Naik setiap set_state, untuk menunggu transisi *setelah* suatu aksi
+        self.track_token = 0  # Naik setiap track baru, callback track lama diabaikan
+        self.prefetch_task = None  # Background resolve lagu berikutnya
+        self.playlist_task = None  # Background load sisa playlist
+        self.text_channel = None
+        self.reconnecting = False  # True selama recovery reconnect, jangan clear queue
+        self.crossfade = 0  # Detik crossfade antar lagu (0 = mati), tidak ikut di-reset
+        self.normalize = False  # Opt-in (n.normalize): gain loudness memaksa decode + re-encode lewat stage efek
+        self.reset(volume)
+
+    def cancel_playlist_load(self):
+        """Hentikan load sisa playlist (seluruh rantai) yang masih berjalan"""
+        if self.playlist_task and not self.playlist_task.done():
+            self.playlist_task.cancel()
+        self.playlist_task = None
+
+    def reset(self, volume):
+        """Kosongkan queue dan kembalikan ke state awal"""
+        if self.prefetch_task and not self.prefetch_task.done():
+            self.prefetch_task.cancel()
+        self.prefetch_task = None
+        self.cancel_playlist_load()
+        self.queue = SongQueue()
+        self.current_song = None
+        self.volume = volume
+        self.loop = False
+        self.loop_queue = False
+        self.playlist_mode = False
+        self.track_started_at = None
+        self.track_offset = 0
+        self.track_token += 1
+        self.set_state(PlayerState.IDLE)
+
+    @property
+    def is_playing(self):
+        return self.state is PlayerState.PLAYING
+
+    def playback_position(self):
+        """Posisi (detik) lagu yang sedang diputar, termasuk offset seek"""
+        if self.track_started_at is None or not self.is_playing:
+            return 0.0
+        return self.track_offset + max(0.0, time.monotonic() - self.track_started_at)
+
+    def set_state(self, state):
+        """Ganti state dan bangunkan semua yang menunggu transisi"""
+        self.state = state
+        self.state_version += 1
+        event = self._state_changed
+        self._state_changed = asyncio.Event()
+        event.set()
+        idle_timers.on_state_change(self.guild_id, state)
+
+    async def wait_for_state(self, *states, timeout=None, after=None):
+        """Tunggu sampai state menjadi salah satu dari states (setelah state_version `after` jika diberikan)"""
+        async def waiter():
+            while self.state not in states or (after is not None and self.state_version <= after):
+                await self._state_changed.wait()
+        await asyncio.wait_for(waiter(), timeout)
+        return self.state
+
+
 class MusicPlayer:
     def __init__(self):
         self.players = {}
-        self.default_volume = 0.5
+        self.default_volume = 1.0  # 100% = tanpa stage efek (Opus passthrough)
     
     def get_player(self, guild_id):
         if guild_id not in self.players:
-            self.players[guild_id] = {
-                'queue': [],
-                'current_song': None,
-                'volume': self.default_volume,
-                'loop': False,
-                'loop_queue': False,
-                'playlist_mode': False,
-                'is_playing': False,  # Track playback state
-                'skip_requested': False,  # Track skip requests
-            }
+            self.players[guild_id] = GuildPlayer(guild_id, self.default_volume)
         return self.players[guild_id]
     
     def clear_guild(self, guild_id):
         """Clear player for specific guild"""
         if guild_id in self.players:
-            self.players[guild_id] = {
-                'queue': [],
-                'current_song': None,
-                'volume': self.default_volume,
-                'loop': False,
-                'loop_queue': False,
-                'playlist_mode': False
-            }
+            self.players[guild_id].reset(self.default_volume)
 
 player = MusicPlayer()
 
+# ============================
+# STREAM URL CACHE
+# ============================
+
+STREAM_CACHE_MAX_ENTRIES = 500
+STREAM_CACHE_DEFAULT_TTL = 1800  # 30 menit untuk URL tanpa parameter expire
+STREAM_CACHE_EXPIRE_MARGIN = 120  # Buang entry 2 menit sebelum googlevideo expire
+
+class StreamCache:
+    """LRU cache webpage URL -> stream URL hasil resolve yt-dlp"""
+
+    def __init__(self, max_entries=STREAM_CACHE_MAX_ENTRIES, default_ttl=STREAM_CACHE_DEFAULT_TTL):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def get_expire_time(stream_url):
+        """Ambil timestamp expire dari URL googlevideo (query ?expire= atau path /expire/)"""
+        try:
+            parsed = urlparse(stream_url)
+            expire = parse_qs(parsed.query).get('expire')
+            if expire:
+                return int(expire[0])
+            match = re.search(r'/expire/(\d+)', parsed.path)
+            if match:
+                return int(match.group(1))
+        except (ValueError, TypeError):
+            pass
+        return None
+
+    def get(self, webpage_url):
+        """Return info stream yang masih valid, atau None"""
+        entry = self.entries.get(webpage_url)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, info = entry
+        if time.time() >= expires_at:
+            del self.entries[webpage_url]
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(webpage_url)
+        self.hits += 1
+        return info
+
+    def put(self, webpage_url, info):
+        """Simpan stream URL + metadata format, TTL mengikuti parameter expire"""
+        stream_url = info.get('url')
+        if not webpage_url or not stream_url:
+            return
+
+        now = time.time()
+        expires_at = now + self.default_ttl
+        expire = self.get_expire_time(stream_url)
+        if expire:
+            expires_at = min(expires_at, expire - STREAM_CACHE_EXPIRE_MARGIN)
+        if expires_at <= now:
+            return
+
+        self.entries[webpage_url] = (expires_at, {
+            'url': stream_url,
+            'title': info.get('title'),
+            'duration': info.get('duration'),
+            'thumbnail': info.get('thumbnail'),
+            'ext': info.get('ext'),
+            'acodec': info.get('acodec'),
+            'abr': info.get('abr'),
+            'asr': info.get('asr'),
+        })
+        self.entries.move_to_end(webpage_url)
+
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def contains(self, webpage_url):
+        """Cek entry valid tanpa mengubah counter hit/miss"""
+        entry = self.entries.get(webpage_url)
+        return entry is not None and time.time() < entry[0]
+
+    def invalidate(self, webpage_url):
+        self.entries.pop(webpage_url, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits / total * 100) if total else 0.0,
+        }
+
+stream_cache = StreamCache()
+
+# ============================
+# YTDL INSTANCE POOL
+# ============================
+
+YTDL_POOL_SIZE = 4  # Maksimal instance per profile
+YTDL_POOL_CHECKOUT_TIMEOUT = 60
+
+# Options tambahan untuk setiap mode download
+DOWNLOAD_FORMAT_OPTIONS = {
+    'yt': {
+        'format': 'best[height<=1080]/best[ext=mp4]',
+        'merge_output_format': 'mp4'
+    },
+    'ytmp3': {
+        'format': 'bestaudio/best',
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }]
+    },
+    'fb': {
+        'format': 'best[ext=mp4]/best',
+        'merge_output_format': 'mp4'
+    },
+}
+DOWNLOAD_FORMAT_OPTIONS['ig'] = DOWNLOAD_FORMAT_OPTIONS['fb']
+DOWNLOAD_FORMAT_OPTIONS['twitter'] = {
+    'format': 'mp4',
+    'merge_output_format': 'mp4'
+}
+
+def get_download_ytdl_options(mode):
+    """Options yt-dlp untuk download_media berdasarkan mode"""
+    return {
+        'outtmpl': os.path.join(DOWNLOADS_PATH, 'temp_download.%(ext)s'),
+        'quiet': True,
+        'noplaylist': True,
+        'no_warnings': True,
+        **DOWNLOAD_FORMAT_OPTIONS[mode],
+    }
+
+class YTDLPool:
+    """Pool YoutubeDL yang dipakai ulang, dikelompokkan per profile options"""
+
+    def __init__(self, max_per_profile=YTDL_POOL_SIZE):
+        self.max_per_profile = max_per_profile
+        self.profiles = {}
+        self.idle = defaultdict(deque)
+        self.created = defaultdict(int)
+        self.condition = threading.Condition()
+        self.stats = defaultdict(lambda: {'checkouts': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+
+    def register(self, profile, options_factory):
+        """Daftarkan profile, options dibuat saat instance pertama dibuat"""
+        self.profiles[profile] = options_factory
+
+    def _checkout(self, profile):
+        started = time.monotonic()
+        deadline = started + YTDL_POOL_CHECKOUT_TIMEOUT
+        ydl = None
+        with self.condition:
+            while True:
+                if self.idle[profile]:
+                    ydl = self.idle[profile].pop()
+                    break
+                if self.created[profile] < self.max_per_profile:
+                    self.created[profile] += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception(f"YTDL pool '{profile}' busy")
+                self.condition.wait(remaining)
+
+        if ydl is None:
+            try:
+                ydl = youtube_dl.YoutubeDL(self.profiles[profile]())
+            except Exception:
+                with self.condition:
+                    self.created[profile] -= 1
+                    self.condition.notify()
+                raise
+
+        waited = time.monotonic() - started
+        with self.condition:
+            stats = self.stats[profile]
+            stats['checkouts'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+        return ydl
+
+    def _checkin(self, profile, ydl):
+        with self.condition:
+            self.idle[profile].append(ydl)
+            self.condition.notify()
+
+    def run(self, profile, func, overrides=None):
+        """Jalankan func(ydl) dengan instance eksklusif (blocking, panggil dari executor)"""
+        ydl = self._checkout(profile)
+        saved = {}
+        try:
+            for key, value in (overrides or {}).items():
+                saved[key] = ydl.params.get(key)
+                ydl.params[key] = value
+            return func(ydl)
+        finally:
+            for key, value in saved.items():
+                ydl.params[key] = value
+            self._checkin(profile, ydl)
+
+    def extract(self, profile, url, download=False, overrides=None):
+        """Shortcut extract_info dengan instance dari pool"""
+        return self.run(profile, lambda ydl: ydl.extract_info(url, download=download), overrides)
+
+    def reset(self):
+        """Buang semua instance idle supaya options baru dipakai"""
+        with self.condition:
+            for profile, instances in self.idle.items():
+                self.created[profile] -= len(instances)
+                for ydl in instances:
+                    try:
+                        ydl.close()
+                    except Exception:
+                        pass
+                instances.clear()
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                profile: {
+                    'instances': self.created[profile],
+                    'idle': len(self.idle[profile]),
+                    'checkouts': stats['checkouts'],
+                    'avg_wait': stats['total_wait'] / stats['checkouts'] if stats['checkouts'] else 0.0,
+                    'max_wait': stats['max_wait'],
+                }
+                for profile, stats in self.stats.items()
+            }
+
+ytdl_pool = YTDLPool()
+ytdl_pool.register('search', lambda: dict(ytdl_format_options))
+ytdl_pool.register('stream', lambda: get_stream_ytdl_options())
+ytdl_pool.register('playlist', lambda: {
+    **ytdl_format_options,
+    'extract_flat': True,
+    'noplaylist': False,
+    'quiet': True,
+    'no_warnings': True,
+})
+for _mode in DOWNLOAD_FORMAT_OPTIONS:
+    ytdl_pool.register(f'download_{_mode}', lambda mode=_mode: get_download_ytdl_options(mode))
+
+# ============================
+# BLOCKING WORK EXECUTORS
+# ============================
+
+MEDIA_EXECUTOR_WORKERS = int(os.environ.get('REIKA_MEDIA_WORKERS', 8))  # Thread khusus yt-dlp
+IO_EXECUTOR_WORKERS = int(os.environ.get('REIKA_IO_WORKERS', 4))  # Lyrics & blocking I/O lain
+MEDIA_PER_GUILD_LIMIT = 2  # Maksimal extraction bersamaan per guild
+MEDIA_QUEUE_LIMIT = 50  # Maksimal job yang boleh antri
+
+media_executor = ThreadPoolExecutor(max_workers=MEDIA_EXECUTOR_WORKERS, thread_name_prefix='reika-media')
+io_executor = ThreadPoolExecutor(max_workers=IO_EXECUTOR_WORKERS, thread_name_prefix='reika-io')
+
+class ExtractionBusyError(Exception):
+    """Antrian extraction penuh"""
+
+class MediaExtractionScheduler:
+    """Admission control untuk media_executor: batas global, batas per guild, dan antrian"""
+
+    def __init__(self, max_workers=MEDIA_EXECUTOR_WORKERS, per_guild_limit=MEDIA_PER_GUILD_LIMIT,
+                 queue_limit=MEDIA_QUEUE_LIMIT):
+        self.max_workers = max_workers
+        self.per_guild_limit = per_guild_limit
+        self.queue_limit = queue_limit
+        self.running = 0
+        self.running_per_guild = defaultdict(int)
+        self.waiting = deque()  # (guild_id, future)
+        self.stats = {'completed': 0, 'queued': 0, 'rejected': 0}
+
+    def _has_capacity(self, guild_id):
+        return (self.running < self.max_workers
+                and self.running_per_guild[guild_id] < self.per_guild_limit)
+
+    def _acquire(self, guild_id):
+        self.running += 1
+        self.running_per_guild[guild_id] += 1
+
+    def _release(self, guild_id):
+        self.running -= 1
+        self.running_per_guild[guild_id] -= 1
+        if self.running_per_guild[guild_id] <= 0:
+            del self.running_per_guild[guild_id]
+
+        # Beri slot ke job antri pertama yang guild-nya masih punya kuota
+        for entry in list(self.waiting):
+            waiting_guild, future = entry
+            if future.done():
+                self.waiting.remove(entry)
+                continue
+            if self._has_capacity(waiting_guild):
+                self.waiting.remove(entry)
+                self._acquire(waiting_guild)
+                future.set_result(True)
+                if self.running >= self.max_workers:
+                    break
+
+    def position(self, future):
+        for i, (_, waiting_future) in enumerate(self.waiting, start=1):
+            if waiting_future is future:
+                return i
+        return 0
+
+    async def run(self, guild_id, func, on_queued=None):
+        """Jalankan func di media_executor, antri jika penuh"""
+        # Waiter guild lain yang hanya tertahan kuota guild-nya sendiri tidak menghalangi guild ini
+        if self._has_capacity(guild_id) and not any(waiting_guild == guild_id for waiting_guild, _ in self.waiting):
+            self._acquire(guild_id)
+        else:
+            if len(self.waiting) >= self.queue_limit:
+                self.stats['rejected'] += 1
+                raise ExtractionBusyError(f"Bot sedang sibuk, antrian penuh ({len(self.waiting)} job)")
+
+            future = asyncio.get_running_loop().create_future()
+            entry = (guild_id, future)
+            self.waiting.append(entry)
+            self.stats['queued'] += 1
+            try:
+                if on_queued:
+                    try:
+                        await on_queued(self.position(future))
+                    except Exception:
+                        pass
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(guild_id)
+                else:
+                    future.cancel()
+                    if entry in self.waiting:
+                        self.waiting.remove(entry)
+                raise
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(media_executor, func)
+        finally:
+            self.stats['completed'] += 1
+            self._release(guild_id)
+
+    def get_stats(self):
+        return {
+            'running': self.running,
+            'waiting': len(self.waiting),
+            **self.stats,
+        }
+
+media_scheduler = MediaExtractionScheduler()
+
+async def run_extraction(guild_id, func, status_msg=None):
+    """Helper extraction yt-dlp, update status_msg dengan posisi antrian jika sibuk"""
+    async def on_queued(position):
+        if status_msg:
+            outbound.edit(status_msg, content=f"⏳ Bot sedang sibuk, posisi antrian: **{position}**")
+    return await media_scheduler.run(guild_id, func, on_queued)
+
+def shutdown_executors():
+    """Matikan executor saat bot berhenti"""
+    media_executor.shutdown(wait=False, cancel_futures=True)
+    io_executor.shutdown(wait=False, cancel_futures=True)
+
+# ============================
+# OUTBOUND MESSAGE SCHEDULER
+# ============================
+
+OUTBOUND_BUCKET_SIZE = 5  # Request per channel per window (limit pesan channel Discord)
+OUTBOUND_BUCKET_WINDOW = 5.0
+
+class OutboundJob:
+    __slots__ = ('kind', 'target', 'kwargs', 'key', 'future', 'queued_at')
+
+    def __init__(self, kind, target, kwargs, key=None):
+        self.kind = kind  # 'send' atau 'edit'
+        self.target = target  # Channel untuk send, Message untuk edit
+        self.kwargs = kwargs
+        self.key = key
+        self.future = asyncio.get_running_loop().create_future()
+        # Caller boleh tidak await, error tetap di-log oleh worker
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.queued_at = time.monotonic()
+
+class OutboundScheduler:
+    """Antrian pesan keluar per channel: patuh rate limit, edit ke pesan yang sama digabung (last-write-wins)"""
+
+    def __init__(self, bucket_size=OUTBOUND_BUCKET_SIZE, bucket_window=OUTBOUND_BUCKET_WINDOW):
+        self.bucket_size = bucket_size
+        self.bucket_window = bucket_window
+        self.queues = {}  # channel_id -> deque job
+        self.workers = {}  # channel_id -> task worker
+        self.pending_edits = {}  # message_id -> job edit yang belum dikirim
+        self.pending_keys = {}  # supersede key -> job send yang belum dikirim
+        self.recent = defaultdict(deque)  # channel_id -> waktu request dalam window
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.stats = {'sent': 0, 'edited': 0, 'coalesced': 0, 'superseded': 0, 'errors': 0}
+
+    def send(self, channel, content=None, supersede=None, **kwargs):
+        """Kirim pesan; supersede=key mengganti status lama dengan key sama yang belum terkirim"""
+        kwargs['content'] = content
+        if supersede is not None and supersede in self.pending_keys:
+            job = self.pending_keys[supersede]
+            job.kwargs = kwargs
+            self.stats['superseded'] += 1
+            return job.future
+        job = self._enqueue(channel.id, OutboundJob('send', channel, kwargs, supersede))
+        if supersede is not None:
+            self.pending_keys[supersede] = job
+        return job.future
+
+    def edit(self, message, **kwargs):
+        """Edit pesan; edit berikutnya sebelum terkirim menimpa field yang sama"""
+        job = self.pending_edits.get(message.id)
+        if job:
+            job.kwargs.update(kwargs)
+            self.stats['coalesced'] += 1
+            return job.future
+        job = self._enqueue(message.channel.id, OutboundJob('edit', message, kwargs, message.id))
+        self.pending_edits[message.id] = job
+        return job.future
+
+    def _enqueue(self, channel_id, job):
+        if len(self.recent) > 1000:
+            # Buang riwayat rate limit channel yang sudah lewat window
+            now = time.monotonic()
+            for idle_id in [cid for cid, times in self.recent.items() if not times or now - times[-1] >= self.bucket_window]:
+                del self.recent[idle_id]
+        self.queues.setdefault(channel_id, deque()).append(job)
+        if channel_id not in self.workers:
+            self.workers[channel_id] = asyncio.get_running_loop().create_task(self._worker(channel_id))
+        return job
+
+    async def _wait_for_slot(self, channel_id):
+        recent = self.recent[channel_id]
+        while True:
+            now = time.monotonic()
+            while recent and now - recent[0] >= self.bucket_window:
+                recent.popleft()
+            if len(recent) < self.bucket_size:
+                recent.append(now)
+                return
+            await asyncio.sleep(self.bucket_window - (now - recent[0]))
+
+    async def _worker(self, channel_id):
+        queue = self.queues[channel_id]
+        try:
+            while queue:
+                await self._wait_for_slot(channel_id)
+                job = queue.popleft()
+                # Setelah diambil, update berikutnya jadi job baru
+                if job.kind == 'edit':
+                    self.pending_edits.pop(job.key, None)
+                elif job.key is not None:
+                    self.pending_keys.pop(job.key, None)
+                
+                wait = time.monotonic() - job.queued_at
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+                try:
+                    if job.kind == 'send':
+                        result = await job.target.send(**job.kwargs)
+                        self.stats['sent'] += 1
+                    else:
+                        result = await job.target.edit(**job.kwargs)
+                        self.stats['edited'] += 1
+                    if not job.future.done():
+                        job.future.set_result(result)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    print(f"⚠️ Outbound {job.kind} failed in channel {channel_id}: {e}")
+                    if isinstance(e, discord.Forbidden) and getattr(job.target, 'guild', None):
+                        # Permission bot di channel ini berubah: cari ulang announce channel berikutnya
+                        invalidate_announce_channel(job.target.guild.id)
+                    if not job.future.done():
+                        job.future.set_exception(e)
+        finally:
+            del self.workers[channel_id]
+            if not queue:
+                del self.queues[channel_id]
+
+    def get_stats(self):
+        done = self.stats['sent'] + self.stats['edited'] + self.stats['errors']
+        return {
+            'depth': sum(len(queue) for queue in self.queues.values()),
+            'channels': len(self.queues),
+            'avg_wait': (self.wait_total / done) if done else 0.0,
+            'max_wait': self.wait_max,
+            **self.stats,
+        }
+
+outbound = OutboundScheduler()
+
+# ============================
+# AUDIO FILE CACHE
+# ============================
+
+# Tiap cluster punya subfolder sendiri (index & eviction tidak saling hapus), budget dibagi rata
+AUDIO_CACHE_PATH = os.path.join("audio_cache", f"cluster-{CLUSTER_ID}") if CLUSTER_COUNT > 1 else "audio_cache"
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get('REIKA_AUDIO_CACHE_MB', 2048)) * 1024 * 1024 // CLUSTER_COUNT
+AUDIO_CACHE_MAX_DURATION = 900  # Lagu > 15 menit / live tidak di-cache
+
+YOUTUBE_ID_PATTERN = re.compile(r"(?:v=|youtu\.be/|embed/|shorts/)([a-zA-Z0-9_-]{11})")
+
+def get_audio_cache_key(song):
+    """Key cache: video id YouTube, atau hash URL untuk sumber lain"""
+    url = song.webpage_url or song.url or ''
+    match = YOUTUBE_ID_PATTERN.search(url)
+    if match:
+        return f"yt-{match.group(1)}"
+    return "url-" + hashlib.sha1(url.encode('utf-8')).hexdigest()[:20]
+
+class CachedOpusAudio(discord.AudioSource):
+    """Putar file Ogg/Opus lokal langsung per packet, tanpa proses ffmpeg"""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._packets = discord.oggparse.OggStream(self._file).iter_packets()
+
+    def read(self):
+        return next(self._packets, b'')
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self._file.close()
+
+class AudioFileCache:
+    """Cache LRU file Ogg/Opus hasil playback, dibatasi total byte"""
+
+    def __init__(self, path=AUDIO_CACHE_PATH, max_bytes=AUDIO_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> size, urutan LRU
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(path, exist_ok=True)
+        # Proses audio node (spawn/forkserver) ikut import modul ini: index & eviction hanya di proses bot
+        if multiprocessing.parent_process() is None:
+            self._load_index()
+
+    def _load_index(self):
+        files = []
+        for name in os.listdir(self.path):
+            file_path = os.path.join(self.path, name)
+            if name.endswith('.part'):
+                # Sisa playback yang terputus
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            elif name.endswith('.ogg'):
+                stat = os.stat(file_path)
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _file_path(self, key):
+        return os.path.join(self.path, f"{key}.ogg")
+
+    def get(self, key):
+        """Path file cache jika ada, sekaligus update urutan LRU"""
+        if key in self.entries and os.path.exists(self._file_path(key)):
+            self.entries.move_to_end(key)
+            self.hits += 1
+            try:
+                os.utime(self._file_path(key))
+            except OSError:
+                pass
+            return self._file_path(key)
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        self.misses += 1
+        return None
+
+    def contains(self, key):
+        return key in self.entries
+
+    def is_cacheable(self, song):
+        return 0 < song.duration <= AUDIO_CACHE_MAX_DURATION
+
+    def begin(self, key):
+        """Path .part untuk ditulis paralel dengan playback"""
+        return os.path.join(self.path, f"{key}.{uuid.uuid4().hex[:8]}.part")
+
+    def commit(self, key, part_path):
+        """Pindahkan .part yang sudah lengkap ke cache, return path file cache"""
+        try:
+            size = os.path.getsize(part_path)
+            if size <= 0:
+                raise OSError("empty cache file")
+            os.replace(part_path, self._file_path(key))
+        except OSError:
+            self.discard(part_path)
+            return None
+        if key in self.entries:
+            self.total_bytes -= self.entries[key]
+        self.entries[key] = size
+        self.total_bytes += size
+        self._evict()
+        print(f"💽 Cached audio {key} ({size / 1024 / 1024:.1f} MB)")
+        return self._file_path(key)
+
+    def discard(self, part_path):
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._file_path(key))
+            except OSError:
+                pass
+
+    @staticmethod
+    def tee_options(ffmpeg_opts, codec, part_path):
+        """Tambah output Ogg ke file .part di proses ffmpeg yang sama dengan playback"""
+        file_codec = 'copy' if codec == 'copy' else 'libopus -b:a 128k -ar 48000 -ac 2'
+        pipe_codec = 'copy' if codec == 'copy' else 'libopus'
+        return {
+            'before_options': ffmpeg_opts['before_options'],
+            'options': (
+                f"{ffmpeg_opts['options']} -c:a {file_codec} -f ogg {shlex.quote(part_path)} "
+                f"-map_metadata -1 -vn -f opus -c:a {pipe_codec} -ar 48000 -ac 2 -b:a 128k"
+            ),
+        }
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits / total * 100) if total else 0.0,
+        }
+
+audio_cache = AudioFileCache()
+
+def create_cached_audio_source(path, start_at=0):
+    """Source dari file cache: langsung per packet, atau ffmpeg copy jika perlu seek"""
+    if start_at > 0:
+        return discord.FFmpegOpusAudio(
+            path,
+            codec='copy',
+            before_options=f'-ss {start_at:.2f} -nostdin',
+            options='-vn'
+        )
+    return CachedOpusAudio(path)
+
+# ============================
+# AUDIO EFFECTS (PCM)
+# ============================
+
+PCM_FRAME_BYTES = 3840  # 20ms s16le stereo 48kHz, sama dengan discord.opus.Encoder.FRAME_SIZE
+PCM_FRAMES_PER_SECOND = 50
+EFFECTS_FADE_IN = 0.3  # Detik fade-in di awal track / setelah seek
+EFFECTS_SKIP_FADE = 0.5  # Detik fade-out saat n.skip
+LIMITER_THRESHOLD = 0.85  # Di atas ini sample dikompres halus (tanh), bukan di-clip
+CROSSFADE_MAX = 12
+
+def effects_active(guild_player, track_gain=1.0):
+    """Stage PCM hanya dipakai jika ada efek; default tetap Opus passthrough"""
+    return NUMPY_AVAILABLE and (guild_player.volume != 1.0 or guild_player.crossfade > 0 or track_gain != 1.0)
+
+def create_pcm_source(url, start_at=0, ffmpeg_opts=None):
+    """FFmpegPCMAudio untuk stream URL atau file cache"""
+    if ffmpeg_opts is None:
+        ffmpeg_opts = {'before_options': f'-ss {start_at:.2f} -nostdin', 'options': '-vn'}
+    return discord.FFmpegPCMAudio(url, **ffmpeg_opts)
+
+class PCMEffectsAudio(discord.AudioSource):
+    """Gain, soft limiter, fade dan crossfade per frame 20ms dengan numpy
+
+    read() dipanggil dari thread audio; volume / fade_out / crossfade_into
+    boleh dipanggil dari event loop.
+    """
+
+    def __init__(self, source, volume=1.0, track_gain=1.0, fade_in=EFFECTS_FADE_IN, crossfade_at=None,
+                 on_crossfade=None, on_handoff=None):
+        self.source = source
+        self.volume = volume  # Target gain, bisa diubah live
+        self.track_gain = track_gain  # Normalisasi loudness track yang sedang diputar
+        self.crossfade_at = crossfade_at  # Frame ke-n track ini saat crossfade perlu disiapkan
+        self.on_crossfade = on_crossfade
+        self.on_handoff = on_handoff
+        self.frames_read = 0
+        self._gain = volume
+        self._envelope = 0.0 if fade_in > 0 else 1.0
+        self._envelope_step = 1.0 / (fade_in * PCM_FRAMES_PER_SECOND) if fade_in > 0 else 0.0
+        self._crossfade_requested = False
+        self._next_source = None
+        self._next_song = None
+        self._next_gain = 1.0
+        self._xfade_pos = 0
+        self._xfade_frames = 0
+        self._lock = threading.Lock()
+
+    def fade_out(self, seconds=EFFECTS_SKIP_FADE):
+        """Fade ke 0 lalu akhiri source (after callback jalan seperti biasa)"""
+        self._envelope_step = -1.0 / max(1, seconds * PCM_FRAMES_PER_SECOND)
+
+    def crossfade_into(self, next_source, song, seconds, track_gain=1.0):
+        """Mulai mix track berikutnya, pindah ke track itu setelah seconds"""
+        with self._lock:
+            if self._next_source:
+                self._next_source.cleanup()
+            self._next_source = next_source
+            self._next_song = song
+            self._next_gain = track_gain
+            self._xfade_pos = 0
+            self._xfade_frames = max(1, int(seconds * PCM_FRAMES_PER_SECOND))
+
+    def _promote(self):
+        """Track berikutnya jadi source utama"""
+        old = self.source
+        self.source = self._next_source
+        song = self._next_song
+        # Gain track baru sudah dipakai selama crossfade, pindahkan ke gain utama
+        self._gain = self._gain / self.track_gain * self._next_gain if self.track_gain else self._gain
+        self.track_gain = self._next_gain
+        elapsed = self._xfade_pos / PCM_FRAMES_PER_SECOND
+        self._next_source = None
+        self._next_song = None
+        self.frames_read = self._xfade_pos
+        self.crossfade_at = None
+        self._crossfade_requested = False
+        old.cleanup()
+        if self.on_handoff:
+            self.on_handoff(song, elapsed)
+
+    def read(self):
+        data = self.source.read()
+        handoff = False
+        with self._lock:
+            if len(data) < PCM_FRAME_BYTES:
+                if not self._next_source:
+                    return b''
+                # Track utama habis lebih cepat dari perkiraan durasi
+                self._promote()
+                data = self.source.read()
+                if len(data) < PCM_FRAME_BYTES:
+                    return b''
+            
+            self.frames_read += 1
+            if (self.crossfade_at is not None and not self._crossfade_requested
+                    and self.frames_read >= self.crossfade_at and self.on_crossfade):
+                self._crossfade_requested = True
+                self.on_crossfade()
+            
+            samples = np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0
+            
+            if self._next_source:
+                other = self._next_source.read()
+                if len(other) < PCM_FRAME_BYTES:
+                    # Track berikutnya terlalu pendek, biarkan play_next yang urus
+                    self._next_source.cleanup()
+                    self._next_source = None
+                    self._next_song = None
+                else:
+                    # Equal-power crossfade, ramp per sample supaya tidak ada step antar frame
+                    start = self._xfade_pos / self._xfade_frames
+                    end = (self._xfade_pos + 1) / self._xfade_frames
+                    ramp = np.repeat(np.linspace(start, end, len(samples) // 2, endpoint=False), 2) * (np.pi / 2)
+                    incoming = np.frombuffer(other, dtype=np.int16).astype(np.float32) / 32768.0
+                    # Gain utama dikalikan ke hasil mix, jadi incoming dikoreksi ke gain-nya sendiri
+                    incoming *= self._next_gain / self.track_gain if self.track_gain else 1.0
+                    samples = samples * np.cos(ramp) + incoming * np.sin(ramp)
+                    self._xfade_pos += 1
+                    # Frame handoff masih dihitung dengan track_gain lama (incoming sudah dikoreksi ke situ),
+                    # pindah gain setelah frame ini selesai supaya tidak dikalikan dua kali
+                    handoff = self._xfade_pos >= self._xfade_frames
+        
+        envelope = min(1.0, max(0.0, self._envelope + self._envelope_step))
+        if self._envelope_step < 0 and envelope <= 0.0:
+            return b''
+        if envelope >= 1.0 and self._envelope_step > 0:
+            self._envelope_step = 0.0
+        
+        # Gain berubah linear sepanjang frame (live volume / fade tanpa bunyi klik)
+        gain = self.volume * self.track_gain * envelope
+        if gain != self._gain:
+            samples *= np.linspace(self._gain, gain, len(samples) // 2, endpoint=False).repeat(2)
+        elif gain != 1.0:
+            samples *= gain
+        self._gain = gain
+        self._envelope = envelope
+        
+        # Soft limiter: kompres bagian di atas threshold, hasil tetap di bawah 1.0
+        peaks = np.abs(samples)
+        if peaks.max() > LIMITER_THRESHOLD:
+            headroom = 1.0 - LIMITER_THRESHOLD
+            loud = peaks > LIMITER_THRESHOLD
+            samples[loud] = np.sign(samples[loud]) * (
+                LIMITER_THRESHOLD + headroom * np.tanh((peaks[loud] - LIMITER_THRESHOLD) / headroom)
+            )
+        
+        if handoff:
+            with self._lock:
+                if self._next_source:
+                    self._promote()
+        
+        return (samples * 32767.0).astype(np.int16).tobytes()
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        with self._lock:
+            if self._next_source:
+                self._next_source.cleanup()
+                self._next_source = None
+        self.source.cleanup()
+
+# ============================
+# AUDIO NODE (OUT-OF-PROCESS)
+# ============================
+
+AUDIO_NODE_COUNT = int(os.environ.get('REIKA_AUDIO_NODES', 0))  # 0 = ffmpeg & encoding di proses bot
+AUDIO_NODE_WINDOW = 25  # Packet (0.5 detik) yang boleh dikirim node di depan playback
+AUDIO_NODE_CREDIT_STEP = 10
+AUDIO_NODE_READ_TIMEOUT = 10  # Detik tanpa packet sebelum track dianggap macet
+AUDIO_NODE_START_TIMEOUT = 15
+
+def open_node_track(spec):
+    """Buat AudioSource dari spec play (dipakai di proses node)"""
+    if spec['kind'] == 'cached':
+        return create_cached_audio_source(spec['input'], spec['start_at'])
+    if spec['kind'] == 'opus':
+        if spec.get('codec'):
+            return discord.FFmpegOpusAudio(spec['input'], codec=spec['codec'], **spec['ffmpeg'])
+        # Codec tidak diketahui: decode ke PCM, node yang encode ke Opus
+        return discord.FFmpegPCMAudio(spec['input'], **spec['ffmpeg'])
+    return create_pcm_source(spec['input'], spec['start_at'], spec.get('ffmpeg'))
+
+class AudioNodeTrack:
+    """Satu track di proses node: baca source, encode ke Opus, kirim packet ke bot sesuai kredit"""
+
+    def __init__(self, conn, spec):
+        self.conn = conn
+        self.credits = 0
+        self.encoder = None
+        source = open_node_track(spec)
+        if spec['kind'] == 'pcm':
+            effects = spec.get('effects') or {}
+            source = PCMEffectsAudio(
+                source,
+                volume=effects.get('volume', 1.0),
+                track_gain=effects.get('track_gain', 1.0),
+                crossfade_at=effects.get('crossfade_at'),
+                on_crossfade=lambda: self.emit('crossfade_due'),
+                on_handoff=lambda song, elapsed: self.emit('handoff', elapsed=elapsed),
+            )
+        if not source.is_opus():
+            self.encoder = discord.opus.Encoder()
+        self.source = source
+
+    def emit(self, event, **data):
+        self.conn.send_bytes(b'E' + json.dumps({'event': event, **data}).encode())
+
+    def handle(self, message):
+        op = message['op']
+        if op == 'credit':
+            self.credits += message['n']
+        elif not isinstance(self.source, PCMEffectsAudio):
+            return
+        elif op == 'set':
+            setattr(self.source, message['name'], message['value'])
+        elif op == 'fade_out':
+            self.source.fade_out(message['seconds'])
+        elif op == 'crossfade':
+            self.source.crossfade_into(
+                open_node_track(message['spec']), None, message['seconds'], message['track_gain']
+            )
+
+    def run(self):
+        try:
+            while True:
+                # Pesan kontrol dulu; tanpa kredit tunggu bot selesai memutar packet sebelumnya
+                while self.conn.poll(0 if self.credits else 0.1):
+                    self.handle(json.loads(self.conn.recv_bytes()))
+                if not self.credits:
+                    continue
+                data = self.source.read()
+                if not data:
+                    break
+                if self.encoder:
+                    data = self.encoder.encode(data, self.encoder.SAMPLES_PER_FRAME)
+                self.conn.send_bytes(b'P' + data)
+                self.credits -= 1
+            self.emit('end')
+        except (EOFError, OSError):
+            pass  # Bot menutup koneksi = stop
+        finally:
+            self.source.cleanup()
+            self.conn.close()
+
+def run_audio_node(address):
+    """Entry point proses audio node: satu koneksi per track, satu thread per koneksi"""
+    if os.path.exists(address):
+        os.remove(address)
+    listener = Listener(address, family='AF_UNIX')
+    print(f"🎛️ Audio node {os.getpid()} listening on {address}")
+    while True:
+        conn = listener.accept()
+        try:
+            track = AudioNodeTrack(conn, json.loads(conn.recv_bytes()))
+        except Exception as e:
+            try:
+                conn.send_bytes(b'E' + json.dumps({'event': 'error', 'message': str(e)}).encode())
+            except OSError:
+                pass
+            conn.close()
+            continue
+        threading.Thread(target=track.run, name='reika-node-track', daemon=True).start()
+
+class RemoteAudioSource(discord.AudioSource):
+    """AudioSource di proses bot: packet Opus dari audio node, kontrol efek lewat IPC"""
+
+    def __init__(self, address, spec, on_crossfade=None, on_handoff=None, on_close=None):
+        self.has_effects = spec['kind'] == 'pcm'
+        effects = spec.get('effects') or {}
+        self._volume = effects.get('volume', 1.0)
+        self._track_gain = effects.get('track_gain', 1.0)
+        self._crossfade_at = effects.get('crossfade_at')
+        self.on_crossfade = on_crossfade
+        self.on_handoff = on_handoff
+        self.on_close = on_close
+        self.consumed = 0
+        self._next_song = None
+        self._send_lock = threading.Lock()  # send dari event loop (kontrol) dan thread audio (kredit)
+        self.conn = Client(address, family='AF_UNIX')
+        self.conn.send_bytes(json.dumps(spec).encode())
+        self._send({'op': 'credit', 'n': AUDIO_NODE_WINDOW})
+
+    def _send(self, message):
+        with self._send_lock:
+            try:
+                self.conn.send_bytes(json.dumps(message).encode())
+            except OSError:
+                pass
+
+    @property
+    def volume(self):
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        self._volume = value
+        self._send({'op': 'set', 'name': 'volume', 'value': value})
+
+    @property
+    def track_gain(self):
+        return self._track_gain
+
+    @track_gain.setter
+    def track_gain(self, value):
+        self._track_gain = value
+        self._send({'op': 'set', 'name': 'track_gain', 'value': value})
+
+    @property
+    def crossfade_at(self):
+        return self._crossfade_at
+
+    @crossfade_at.setter
+    def crossfade_at(self, value):
+        self._crossfade_at = value
+        self._send({'op': 'set', 'name': 'crossfade_at', 'value': value})
+
+    def fade_out(self, seconds=EFFECTS_SKIP_FADE):
+        self._send({'op': 'fade_out', 'seconds': seconds})
+
+    def crossfade_into_spec(self, spec, song, seconds, track_gain=1.0):
+        """Seperti PCMEffectsAudio.crossfade_into, tapi source dibuka di node dari spec"""
+        self._next_song = song
+        self._send({'op': 'crossfade', 'spec': spec, 'seconds': seconds, 'track_gain': track_gain})
+
+    def read(self):
+        while True:
+            try:
+                # Node yang hang tidak boleh membekukan thread player selamanya
+                if not self.conn.poll(AUDIO_NODE_READ_TIMEOUT):
+                    print(f"⚠️ Audio node silent for {AUDIO_NODE_READ_TIMEOUT}s, ending track")
+                    return b''
+                data = self.conn.recv_bytes()
+            except (EOFError, OSError):
+                return b''
+            if data[:1] == b'P':
+                self.consumed += 1
+                if self.consumed % AUDIO_NODE_CREDIT_STEP == 0:
+                    self._send({'op': 'credit', 'n': AUDIO_NODE_CREDIT_STEP})
+                return data[1:]
+            
+            event = json.loads(data[1:])
+            if event['event'] == 'crossfade_due':
+                if self.on_crossfade:
+                    self.on_crossfade()
+            elif event['event'] == 'handoff':
+                song, self._next_song = self._next_song, None
+                self._crossfade_at = None
+                if self.on_handoff:
+                    self.on_handoff(song, event['elapsed'])
+            elif event['event'] == 'error':
+                print(f"⚠️ Audio node error: {event.get('message')}")
+                return b''
+            else:
+                return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        with self._send_lock:
+            self.conn.close()
+        if self.on_close:
+            self.on_close()
+            self.on_close = None
+
+class AudioNodePool:
+    """Proses audio node (ffmpeg, efek, encoding Opus), guild dibagi per node"""
+
+    def __init__(self, count=AUDIO_NODE_COUNT, socket_dir=None):
+        self.count = count
+        self.socket_dir = socket_dir
+        self.context = None
+        self.addresses = []
+        self.processes = []
+        self.restarting = {}  # index -> task restart
+        self.streams = 0
+        self.restarts = 0
+
+    @property
+    def enabled(self):
+        return bool(self.processes)
+
+    def _spawn(self, index):
+        # Proses bot multithreaded: node dibuat lewat forkserver/spawn, bukan fork langsung
+        if os.path.exists(self.addresses[index]):
+            os.remove(self.addresses[index])
+        process = self.context.Process(
+            target=run_audio_node,
+            args=(self.addresses[index],),
+            name=f'reika-audio-node-{index}',
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def _is_ready(self, index):
+        return index not in self.restarting and self.processes[index].is_alive()
+
+    def start(self):
+        """Jalankan node; panggil sebelum bot.run (boleh blocking, event loop belum jalan)"""
+        if self.count <= 0:
+            return
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        self.addresses = [
+            os.path.join(self.socket_dir or get_runtime_dir(), f"reika-audio-node-{os.getpid()}-{index}.sock")
+            for index in range(self.count)
+        ]
+        self.processes = [self._spawn(index) for index in range(self.count)]
+        deadline = time.monotonic() + AUDIO_NODE_START_TIMEOUT
+        while not all(os.path.exists(address) for address in self.addresses) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        print(f"🎛️ Started {self.count} audio node(s)")
+
+    async def _restart(self, index):
+        """Spawn ulang node yang mati, tunggu socket-nya siap tanpa memblokir event loop"""
+        try:
+            self.processes[index] = self._spawn(index)
+            deadline = time.monotonic() + AUDIO_NODE_START_TIMEOUT
+            while not os.path.exists(self.addresses[index]) and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+        finally:
+            del self.restarting[index]
+
+    def open(self, guild_id, spec, on_crossfade=None, on_handoff=None):
+        """RemoteAudioSource untuk guild di node miliknya; node mati di-restart di background
+        dan sementara itu track dibuka di node lain yang siap"""
+        index = guild_id % self.count
+        if not self.processes[index].is_alive() and index not in self.restarting:
+            print(f"⚠️ Audio node {index} died, restarting")
+            self.restarts += 1
+            self.restarting[index] = asyncio.get_running_loop().create_task(self._restart(index))
+        if not self._is_ready(index):
+            index = next((i for i in range(self.count) if self._is_ready(i)), None)
+            if index is None:
+                raise Exception("Audio node sedang restart, coba lagi sebentar")
+        self.streams += 1
+        return RemoteAudioSource(
+            self.addresses[index], spec, on_crossfade, on_handoff, on_close=self._stream_closed
+        )
+
+    def _stream_closed(self):
+        self.streams -= 1
+
+    def shutdown(self):
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        for address in self.addresses:
+            try:
+                os.remove(address)
+            except OSError:
+                pass
+
+    def get_stats(self):
+        return {
+            'nodes': len(self.processes),
+            'alive': sum(1 for process in self.processes if process.is_alive()),
+            'streams': self.streams,
+            'restarts': self.restarts,
+        }
+
+audio_nodes = AudioNodePool()
+
+def get_effects_source(voice_client):
+    """Source aktif yang mendukung kontrol efek live (lokal atau di audio node), atau None"""
+    source = voice_client.source if voice_client else None
+    if isinstance(source, PCMEffectsAudio) or (isinstance(source, RemoteAudioSource) and source.has_effects):
+        return source
+    return None
+
 # ============================
 # BOT SETUP
 # ============================
@@ -167,12 +1651,167 @@ intents = discord.Intents.default()
 intents.message_content = True
 intents.voice_states = True
 
-bot = commands.Bot(
-    command_prefix=PREFIX,
-    intents=intents,
-    help_command=None,
-    case_insensitive=True 
-)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        command_prefix=PREFIX,
+        intents=intents,
+        help_command=None,
+        case_insensitive=True,
+        shard_count=SHARD_COUNT,
+        shard_ids=SHARD_IDS
+    )
+else:
+    bot = commands.Bot(
+        command_prefix=PREFIX,
+        intents=intents,
+        help_command=None,
+        case_insensitive=True 
+    )
+
+# ============================
+# HTTP CLIENT
+# ============================
+
+HTTP_TIMEOUT = float(os.environ.get('REIKA_HTTP_TIMEOUT', 30))  # Detik, default untuk semua request
+HTTP_LIMIT_PER_HOST = int(os.environ.get('REIKA_HTTP_LIMIT_PER_HOST', 10))
+HTTP_RETRIES = 2  # Retry tambahan untuk GET/HEAD
+HTTP_RETRY_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class RetryingRequest:
+    """Context manager request dari session bersama, GET/HEAD di-retry dengan backoff"""
+
+    def __init__(self, client, method, url, kwargs):
+        self.client = client
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self):
+        self.response = await self.client.request(self.method, self.url, **self.kwargs)
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.response.release()
+
+class SharedSession:
+    """Pengganti aiohttp.ClientSession per call: pakai session aplikasi, tidak ditutup di akhir blok"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    def get(self, url, **kwargs):
+        return RetryingRequest(self.client, 'GET', url, kwargs)
+
+    def head(self, url, **kwargs):
+        return RetryingRequest(self.client, 'HEAD', url, kwargs)
+
+    def post(self, url, **kwargs):
+        return RetryingRequest(self.client, 'POST', url, kwargs)
+
+    def put(self, url, **kwargs):
+        return RetryingRequest(self.client, 'PUT', url, kwargs)
+
+class HTTPClient:
+    """Satu aiohttp session untuk semua HTTP keluar: pool koneksi per host, DNS cache, retry, statistik per host"""
+
+    def __init__(self, timeout=HTTP_TIMEOUT, limit_per_host=HTTP_LIMIT_PER_HOST, retries=HTTP_RETRIES):
+        self.timeout = timeout
+        self.limit_per_host = limit_per_host
+        self.retries = retries
+        self._session = None
+        self.hosts = defaultdict(lambda: {'requests': 0, 'errors': 0, 'retries': 0, 'total_latency': 0.0, 'max_latency': 0.0})
+
+    def _trace_config(self):
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, context, params):
+            context.started = time.monotonic()
+
+        async def on_end(session, context, params):
+            stats = self.hosts[params.url.host]
+            latency = time.monotonic() - context.started
+            stats['requests'] += 1
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            if params.response.status >= 500:
+                stats['errors'] += 1
+
+        async def on_exception(session, context, params):
+            stats = self.hosts[params.url.host]
+            stats['requests'] += 1
+            stats['errors'] += 1
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_exception)
+        return trace
+
+    async def start(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=100, limit_per_host=self.limit_per_host, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._trace_config()]
+            )
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def session(self):
+        """Dipakai seperti aiohttp.ClientSession(): `async with http_client.session() as session:`"""
+        return SharedSession(self)
+
+    async def request(self, method, url, **kwargs):
+        """Request dengan retry + exponential backoff untuk method idempotent"""
+        session = await self.start()
+        if isinstance(kwargs.get('timeout'), (int, float)):
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=kwargs['timeout'])
+        attempts = self.retries + 1 if method in ('GET', 'HEAD') else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = await session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                delay = HTTP_RETRY_BACKOFF * 2 ** attempt
+            else:
+                if response.status not in HTTP_RETRY_STATUSES or last_attempt:
+                    return response
+                retry_after = response.headers.get('Retry-After', '')
+                delay = float(retry_after) if retry_after.isdigit() else HTTP_RETRY_BACKOFF * 2 ** attempt
+                response.release()
+            self.hosts[urlparse(url).hostname]['retries'] += 1
+            await asyncio.sleep(min(delay, 10))
+
+    def get_stats(self):
+        return {
+            host: {**stats, 'avg_latency': stats['total_latency'] / stats['requests'] if stats['requests'] else 0.0}
+            for host, stats in self.hosts.items()
+        }
+
+http_client = HTTPClient()
+
+async def start_http_client():
+    await http_client.start()
+
+async def close_bot_and_http_client(close_bot=bot.close):
+    await close_bot()
+    await http_client.close()
+
+# Session dibuat di setup_hook (event loop bot sudah jalan) dan ditutup bersama bot
+bot.setup_hook = start_http_client
+bot.close = close_bot_and_http_client
 
 # ============================
 # HELPER FUNCTIONS
@@ -186,11 +1825,146 @@ def get_guild_player_by_id(guild_id):
     """Get player by guild_id directly"""
     return player.get_player(guild_id)
 
+# Cache guild_id -> text channel untuk pengumuman, di-invalidate saat channel/permission berubah
+announce_channels = {}
+
+def get_voice_client(guild_id):
+    """Voice client untuk guild lewat guild.voice_client (lookup dict, tanpa scan bot.voice_clients)"""
+    guild = bot.get_guild(guild_id)
+    return guild.voice_client if guild else None
+
+def get_announce_channel(guild):
+    """Channel tempat command musik dipanggil; fallback text channel pertama yang bisa dikirimi bot
+    (system channel diutamakan), fallback di-cache per guild"""
+    guild_player = player.players.get(guild.id)
+    text_channel = guild_player.text_channel if guild_player else None
+    if (text_channel and guild.get_channel(text_channel.id)
+            and text_channel.permissions_for(guild.me).send_messages):
+        return text_channel
+    
+    if guild.id in announce_channels:
+        return announce_channels[guild.id]
+    
+    channel = None
+    candidates = [guild.system_channel] if guild.system_channel else []
+    candidates.extend(guild.text_channels)
+    for candidate in candidates:
+        if candidate.permissions_for(guild.me).send_messages:
+            channel = candidate
+            break
+    
+    announce_channels[guild.id] = channel
+    return channel
+
+def invalidate_announce_channel(guild_id):
+    """Buang cache announce channel guild (channel/role/permission berubah)"""
+    announce_channels.pop(guild_id, None)
+
+VOICE_IDLE_TIMEOUT = int(os.environ.get('REIKA_VOICE_IDLE_TIMEOUT', 600))  # Tidak ada lagu & queue kosong
+VOICE_ALONE_TIMEOUT = int(os.environ.get('REIKA_VOICE_ALONE_TIMEOUT', 60))  # Bot sendirian di voice channel
+
+class IdleVoiceTimers:
+    """Timer disconnect per guild di satu heap, dijalankan oleh satu task (tanpa polling)"""
+
+    IDLE = 'idle'
+    ALONE = 'alone'
+
+    def __init__(self):
+        self.heap = []  # (deadline, seq, guild_id, reason)
+        self.armed = {}  # (guild_id, reason) -> seq, entry heap lain dianggap batal
+        self.seq = 0
+        self.wakeup = None
+        self.task = None
+        self.disconnects = defaultdict(int)
+
+    def arm(self, guild_id, reason, timeout):
+        """Pasang (atau reset) timer reason untuk guild"""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self.seq += 1
+        self.armed[(guild_id, reason)] = self.seq
+        heapq.heappush(self.heap, (time.monotonic() + timeout, self.seq, guild_id, reason))
+        if self.task is None or self.task.done():
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+        elif self.heap[0][1] == self.seq:
+            self.wakeup.set()  # Deadline baru paling awal
+
+    def is_armed(self, guild_id, reason):
+        return (guild_id, reason) in self.armed
+
+    def cancel(self, guild_id, reason=None):
+        """Batalkan timer reason (atau semua timer) untuk guild"""
+        for key in ([(guild_id, reason)] if reason else [(guild_id, self.IDLE), (guild_id, self.ALONE)]):
+            self.armed.pop(key, None)
+
+    def on_state_change(self, guild_id, state):
+        if state is PlayerState.IDLE:
+            if get_voice_client(guild_id):
+                self.arm(guild_id, self.IDLE, VOICE_IDLE_TIMEOUT)
+        elif state is PlayerState.PLAYING:
+            self.cancel(guild_id, self.IDLE)
+
+    async def _run(self):
+        while self.heap:
+            deadline, seq, guild_id, reason = self.heap[0]
+            if self.armed.get((guild_id, reason)) != seq:
+                heapq.heappop(self.heap)  # Sudah dibatalkan / di-reset
+                continue
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self.heap)
+            del self.armed[(guild_id, reason)]
+            try:
+                await self._expire(guild_id, reason)
+            except Exception as e:
+                print(f"⚠️ Idle disconnect error (guild {guild_id}): {e}")
+
+    async def _expire(self, guild_id, reason):
+        """Cek ulang kondisi saat timer habis, disconnect jika masih idle"""
+        voice_client = get_voice_client(guild_id)
+        if not voice_client:
+            return
+        guild_player = get_guild_player_by_id(guild_id)
+        if guild_player.reconnecting:
+            return
+        
+        if reason == self.ALONE:
+            if len(voice_client.channel.members) > 1:
+                return
+        elif (voice_client.is_playing() or voice_client.is_paused()
+              or guild_player.queue or guild_player.state is not PlayerState.IDLE):
+            return
+        
+        print(f"💤 Disconnecting from guild {guild_id} ({reason})")
+        self.disconnects[reason] += 1
+        player.clear_guild(guild_id)
+        if voice_client.is_playing() or voice_client.is_paused():
+            voice_client.stop()
+        await voice_client.disconnect()
+
+    def get_stats(self):
+        return {
+            'armed': len(self.armed),
+            'idle_disconnects': self.disconnects[self.IDLE],
+            'alone_disconnects': self.disconnects[self.ALONE],
+        }
+
+idle_timers = IdleVoiceTimers()
+
 async def get_context_from_guild(guild_id):
     """Create a minimal context from guild_id"""
     guild = bot.get_guild(guild_id)
-    if guild and guild.text_channels:
-        channel = guild.text_channels[0]
+    channel = get_announce_channel(guild) if guild else None
+    if channel:
         class SimpleContext:
             def __init__(self, guild, channel):
                 self.guild = guild
@@ -203,31 +1977,370 @@ async def get_context_from_guild(guild_id):
 # MUSIC CORE FUNCTIONS
 # ============================
 
-def get_ffmpeg_options(force_start_zero=True):
-    """Get FFmpeg options yang PASTI mulai dari 0"""
-    if force_start_zero:
-        return {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -ss 0 -nostdin',
-            'options': '-vn -b:a 128k -af "aresample=async=1:min_hard_comp=0.100:first_pts=0"'
-        }
+def get_ffmpeg_options(start_at=0):
+    """Get FFmpeg options, -ss di sisi input supaya seek tidak decode dari awal"""
+    return {
+        'before_options': f'-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -ss {start_at:.2f} -nostdin -timeout 60000000',
+        'options': '-vn -b:a 128k -bufsize 1024k'
+    }
+
+def parse_timestamp(value):
+    """Parse '90', '1:30' atau '1:02:03' jadi detik"""
+    parts = value.strip().split(':')
+    if not parts or len(parts) > 3 or not all(p.strip().isdigit() for p in parts):
+        raise ValueError(f"Invalid timestamp: {value}")
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+# Resolve yang sedang berjalan, supaya prefetch dan play_song tidak extract URL yang sama dua kali
+stream_resolving = {}
+
+PREFETCH_DEPTH = 2  # Jumlah lagu di depan queue yang di-resolve lebih dulu
+
+def get_stream_ytdl_options():
+    """Options yt-dlp untuk resolve stream URL (sama dengan fresh_opts play path sebelumnya)"""
     return {
-        'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -nostdin',
-        'options': '-vn -b:a 128k'
+        **ytdl_format_options,
+        'no_cache_dir': True,
+        'cachedir': False,
+        'force_generic_extractor': True,
     }
 
-async def play_song(voice_client, song, ctx=None):
-    """Play song dengan PASTI mulai dari detik 0 - FIXED VERSION"""
+async def resolve_stream(song, guild_id=None):
+    """Resolve stream URL untuk song, pakai stream_cache atau resolve yang sedang berjalan"""
+    cache_key = song.webpage_url or song.url
+    info = stream_cache.get(cache_key)
+    if info:
+        return info
+    
+    pending = stream_resolving.get(cache_key)
+    if pending:
+        return await asyncio.shield(pending)
+    
+    async def do_resolve():
+        data = await run_extraction(
+            guild_id,
+            lambda: ytdl_pool.extract('stream', cache_key)
+        )
+        
+        if data and 'entries' in data:
+            data = data['entries'][0] if data['entries'] else None
+        
+        if not data or 'url' not in data:
+            raise Exception("No audio URL found")
+        
+        stream_cache.put(cache_key, data)
+        return data
+    
+    task = asyncio.ensure_future(do_resolve())
+    stream_resolving[cache_key] = task
+    try:
+        return await asyncio.shield(task)
+    finally:
+        if task.done():
+            stream_resolving.pop(cache_key, None)
+        else:
+            task.add_done_callback(lambda _: stream_resolving.pop(cache_key, None))
+
+async def prefetch_upcoming(guild_id):
+    """Resolve stream URL lagu berikutnya di background selama lagu sekarang diputar"""
+    guild_player = get_guild_player_by_id(guild_id)
+    for song in list(guild_player.queue[:PREFETCH_DEPTH]):
+        cache_key = song.webpage_url or song.url
+        if stream_cache.contains(cache_key) or audio_cache.contains(get_audio_cache_key(song)):
+            continue
+        try:
+            await resolve_stream(song, guild_id)
+            print(f"⏩ Prefetched: {song.title}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Prefetch failed for {song.title}: {e}")
+
+def schedule_prefetch(guild_id):
+    """(Re)start task prefetch untuk guild"""
+    if not YTDL_AVAILABLE:
+        return
+    guild_player = get_guild_player_by_id(guild_id)
+    task = guild_player.prefetch_task
+    if task and not task.done():
+        task.cancel()
+    guild_player.prefetch_task = bot.loop.create_task(prefetch_upcoming(guild_id))
+
+async def search_youtube(query, guild_id=None, status_msg=None):
+    """Extract URL / ytsearch: query, return info entry pertama atau None"""
+    data = await run_extraction(
+        guild_id,
+        lambda: ytdl_pool.extract('search', query),
+        status_msg
+    )
+    if data and 'entries' in data:
+        data = data['entries'][0] if data['entries'] else None
+    if data:
+        # Hasil search sudah berisi stream URL, simpan supaya play_song tidak extract ulang
+        stream_cache.put(data.get('webpage_url') or data.get('url'), data)
+    return data
+
+PLAYLIST_FIRST_PAGE = 25  # Entry pertama yang di-load sebelum mulai main
+PLAYLIST_MAX_SONGS = 1000  # Batas maksimal untuk prevent abuse
+PLAYLIST_PAGE_SIZE = 100  # Entry per extract saat load sisa playlist di background
+
+async def fetch_playlist_page(guild_id, url, start, end, requester, status_msg=None):
+    """Ambil entry flat playlist nomor start..end sebagai Song placeholder (resolve nanti)"""
+    data = await run_extraction(
+        guild_id,
+        lambda: ytdl_pool.extract('playlist', url, overrides={'playlist_items': f'{start}-{end}'}),
+        status_msg
+    )
+    if not data or 'entries' not in data:
+        return None, []
+    
+    songs = []
+    for entry in data['entries']:
+        if not entry:
+            continue
+        try:
+            songs.append(Song({
+                'title': entry.get('title'),
+                'url': entry.get('url') or entry.get('webpage_url'),
+                'webpage_url': entry.get('webpage_url') or entry.get('url'),
+                'duration': entry.get('duration'),
+            }, requester))
+        except Exception as e:
+            print(f"Error processing playlist entry: {e}")
+    return data.get('title'), songs
+
+async def load_playlist_remainder(guild_id, url, requester, status_msg, title, loaded, previous=None):
+    """Load sisa playlist per halaman di background, tiap halaman langsung masuk queue
+
+    previous: load playlist sebelumnya di guild ini; fetch jalan paralel, tapi lagu
+    baru ditambahkan setelah playlist sebelumnya selesai (urutan tetap).
+    """
+    guild_player = get_guild_player_by_id(guild_id)
+    queue_ref = guild_player.queue
+    total = loaded
+    try:
+        start = PLAYLIST_FIRST_PAGE + 1
+        while start <= PLAYLIST_MAX_SONGS:
+            end = min(start + PLAYLIST_PAGE_SIZE - 1, PLAYLIST_MAX_SONGS)
+            _, songs = await fetch_playlist_page(guild_id, url, start, end, requester)
+            if previous:
+                await asyncio.gather(previous, return_exceptions=True)
+                previous = None
+            # Queue sudah di-reset (stop/clear_guild) selama loading
+            if get_guild_player_by_id(guild_id).queue is not queue_ref:
+                return
+            if not songs:
+                break
+            
+            guild_player.playlist_mode = True
+            queue_ref.extend(songs)
+            guild_player.playlist_mode = False
+            total += len(songs)
+            schedule_prefetch(guild_id)
+            start = end + 1
+            if start <= PLAYLIST_MAX_SONGS:
+                outbound.edit(status_msg, content=f"🎵 Added {total} songs from playlist: **{title}** (loading more...)")
+        
+        content = f"🎵 Added {total} songs from playlist: **{title}**"
+        if total >= PLAYLIST_MAX_SONGS:
+            content += f"\n⚠️ Playlist terlalu besar! Hanya mengambil {PLAYLIST_MAX_SONGS} lagu pertama."
+        await outbound.edit(status_msg, content=content)
+    except asyncio.CancelledError:
+        # stop / clear membatalkan load terakhir: teruskan ke seluruh rantai, status jangan tetap "loading more..."
+        if previous and not previous.done():
+            previous.cancel()
+        outbound.edit(status_msg, content=f"🎵 Added {total} songs from playlist: **{title}** (load sisanya dihentikan)")
+        raise
+    except Exception as e:
+        print(f"⚠️ Playlist remainder error: {e}")
+        try:
+            await outbound.edit(status_msg, content=f"🎵 Added {total} songs from playlist: **{title}** (gagal load sisanya)")
+        except Exception:
+            pass
+
+def get_stream_codec(info):
+    """Tentukan codec FFmpegOpusAudio dari metadata yt-dlp, None jika tidak diketahui
+
+    FFmpegOpusAudio hanya stream-copy untuk 'opus'/'libopus'/'copy'; nama codec lain
+    (mp4a, mp3, vorbis, ...) membuatnya re-encode ke libopus.
+    """
+    acodec = (info.get('acodec') or '').lower()
+    if not acodec or acodec == 'none':
+        return None
+    if acodec.startswith('opus'):
+        # Opus 48kHz (webm/ogg dari YouTube) bisa dikirim langsung tanpa re-encode
+        return 'copy' if info.get('asr') in (None, 48000) else None
+    return acodec
+
+async def create_audio_source(url, info, ffmpeg_opts):
+    """Buat FFmpegOpusAudio tanpa ffprobe jika codec sudah diketahui dari extraction"""
+    codec = get_stream_codec(info)
+    if codec:
+        print(f"🎚️ Audio source: {info.get('acodec')} -> {codec}")
+        return discord.FFmpegOpusAudio(url, codec=codec, **ffmpeg_opts)
+    
+    # Metadata tidak lengkap, fallback ke probe
+    try:
+        return await discord.FFmpegOpusAudio.from_probe(
+            url,
+            **ffmpeg_opts,
+            timeout=30  # Timeout 30 detik
+        )
+    except Exception as e:
+        print(f"⚠️ FFmpegOpusAudio probe failed: {e}")
+        try:
+            return discord.FFmpegPCMAudio(
+                url,
+                **ffmpeg_opts
+            )
+        except Exception as e2:
+            print(f"❌ FFmpegPCMAudio failed: {e2}")
+            raise Exception(f"Gagal membuat audio source: {e2}")
+
+async def on_track_end(guild_id, track_token, error=None, cache_commit=None):
+    """Lanjut ke lagu berikutnya, hanya jika callback berasal dari track yang masih aktif"""
+    try:
+        guild_player = get_guild_player_by_id(guild_id)
+        
+        # Simpan file cache hanya jika lagu selesai diputar sampai habis
+        if cache_commit:
+            audio_key, cache_part, duration = cache_commit
+            finished = (guild_player.track_token == track_token and not error
+                        and guild_player.playback_position() >= duration - 3)
+            if finished:
+                cached_path = audio_cache.commit(audio_key, cache_part)
+                if cached_path:
+                    # Ukur loudness dari file lokal, sekali per video
+                    loudness_cache.schedule(audio_key, cached_path)
+            else:
+                audio_cache.discard(cache_part)
+        
+        if guild_player.track_token != track_token:
+            print(f"↩️ Callback for replaced track ignored (guild {guild_id})")
+            return
+        
+        if error and guild_player.current_song:
+            stream_cache.invalidate(guild_player.current_song.webpage_url or guild_player.current_song.url)
+        
+        guild_player.set_state(PlayerState.TRANSITIONING)
+        
+        # Cek jika voice client masih connected
+        if not get_voice_client(guild_id):
+            print("❌ Voice client not found or disconnected")
+            guild_player.set_state(PlayerState.IDLE)
+            return
+        
+        print(f"🔄 Callback: Attempting to play next for guild {guild_id}")
+        await play_next(guild_id=guild_id)
+    except Exception as e:
+        print(f"❌ Error in on_track_end: {e}")
+        traceback.print_exc()
+
+def get_crossfade_frame(guild_player, song, start_at=0):
+    """Frame (dari start_at) saat crossfade ke lagu berikutnya perlu disiapkan"""
+    if guild_player.crossfade <= 0 or not song.duration:
+        return None
+    # Sisakan 2 detik untuk resolve + buka ffmpeg lagu berikutnya
+    lead = song.duration - start_at - guild_player.crossfade - 2
+    return int(lead * PCM_FRAMES_PER_SECOND) if lead > 0 else None
+
+def create_effects_source(guild_id, track_token, song, start_at=0, track_gain=1.0, pcm_source=None, node_spec=None):
+    """Stage efek lokal (pcm_source) atau source di audio node (node_spec), callback crossfade terikat ke track_token"""
+    guild_player = get_guild_player_by_id(guild_id)
+    source = None
+
+    def on_crossfade():
+        asyncio.run_coroutine_threadsafe(prepare_crossfade(guild_id, track_token, source), bot.loop)
+
+    def on_handoff(next_song, elapsed):
+        asyncio.run_coroutine_threadsafe(
+            on_crossfade_handoff(guild_id, track_token, source, next_song, elapsed), bot.loop
+        )
+
+    crossfade_at = get_crossfade_frame(guild_player, song, start_at)
+    if node_spec is not None:
+        node_spec['effects'] = {'volume': guild_player.volume, 'track_gain': track_gain, 'crossfade_at': crossfade_at}
+        source = audio_nodes.open(guild_id, node_spec, on_crossfade, on_handoff)
+        return source
+    
+    source = PCMEffectsAudio(
+        pcm_source,
+        volume=guild_player.volume,
+        track_gain=track_gain,
+        crossfade_at=crossfade_at,
+        on_crossfade=on_crossfade,
+        on_handoff=on_handoff,
+    )
+    return source
+
+async def prepare_crossfade(guild_id, track_token, source):
+    """Buka PCM source lagu berikutnya dan mulai crossfade di stage efek"""
+    guild_player = get_guild_player_by_id(guild_id)
+    try:
+        async with guild_player.lock:
+            if guild_player.track_token != track_token or guild_player.crossfade <= 0:
+                return
+            if guild_player.loop and guild_player.current_song:
+                next_song = guild_player.current_song
+            elif guild_player.queue:
+                next_song = guild_player.queue[0]
+            else:
+                return
+            
+            cached_path = audio_cache.get(get_audio_cache_key(next_song))
+            if cached_path:
+                spec = {'kind': 'pcm', 'input': cached_path, 'start_at': 0, 'ffmpeg': None}
+            else:
+                info = await resolve_stream(next_song, guild_id)
+                spec = {'kind': 'pcm', 'input': info['url'], 'start_at': 0, 'ffmpeg': get_ffmpeg_options()}
+            
+            if guild_player.track_token != track_token:
+                return
+            track_gain = loudness_cache.get_gain(next_song) if guild_player.normalize else 1.0
+            if isinstance(source, RemoteAudioSource):
+                source.crossfade_into_spec(spec, next_song, guild_player.crossfade, track_gain)
+            else:
+                pcm_source = create_pcm_source(spec['input'], ffmpeg_opts=spec['ffmpeg'])
+                source.crossfade_into(pcm_source, next_song, guild_player.crossfade, track_gain)
+            print(f"🔀 Crossfading into: {next_song.title}")
+    except Exception as e:
+        print(f"⚠️ Crossfade prepare failed (guild {guild_id}): {e}")
+
+async def on_crossfade_handoff(guild_id, track_token, source, song, elapsed):
+    """Stage efek sudah pindah ke lagu berikutnya, update queue seperti play_next"""
+    guild_player = get_guild_player_by_id(guild_id)
+    async with guild_player.lock:
+        if guild_player.track_token != track_token:
+            return
+        if not (guild_player.loop and song is guild_player.current_song):
+            if guild_player.queue and guild_player.queue[0] is song:
+                guild_player.queue.pop(0)
+            if guild_player.loop_queue:
+                guild_player.queue.append(song)
+        
+        guild_player.current_song = song
+        guild_player.track_offset = elapsed
+        guild_player.track_started_at = time.monotonic()
+        source.crossfade_at = get_crossfade_frame(guild_player, song)
+        schedule_prefetch(guild_id)
+    
+    guild = bot.get_guild(guild_id)
+    if guild and song is not None:
+        await announce_now_playing(guild_player, song, guild)
+
+async def play_song(voice_client, song, ctx=None, start_at=0):
+    """Play song mulai dari detik start_at (default 0) - FIXED VERSION"""
+    cache_part = None
     try:
         print(f"🎵 Starting FRESH playback for: {song.title}")
         
         # SIMPAN CONTEXT ATAU BUAT CONTEXT BARU
         if ctx is None:
             guild = voice_client.guild
-            text_channel = None
-            for channel in guild.text_channels:
-                if channel.permissions_for(guild.me).send_messages:
-                    text_channel = channel
-                    break
+            text_channel = get_announce_channel(guild)
             
             if text_channel:
                 class FakeContext:
@@ -246,31 +2359,34 @@ async def play_song(voice_client, song, ctx=None):
         timestamp = int(time.time())
         random_str = random.randint(100000, 999999)
         
-        # Config tanpa cache
-        fresh_opts = {
-            **ytdl_format_options,
-            'no_cache_dir': True,
-            'cachedir': False,
-            'force_generic_extractor': True,
-        }
-        
         # ====== PERBAIKAN 1: TAMPILKAN STATUS SEARCH ======
         if 'search:' in song.url.lower() or 'ytsearch:' in song.url.lower():
             print("🔍 Processing search query...")
             if ctx and hasattr(ctx, 'channel'):
-                try:
-                    await ctx.channel.send("🔍 Mencari lagu...")
-                except:
-                    pass
+                outbound.send(ctx.channel, "🔍 Mencari lagu...", supersede=('searching', ctx.guild.id))
         
-        with youtube_dl.YoutubeDL(fresh_opts) as ydl:
-            info = await bot.loop.run_in_executor(
-                None,
-                lambda: ydl.extract_info(song.url, download=False)
-            )
+        start_at = max(0, start_at)
+        guild_player = get_guild_player_by_id(guild_id)
+        track_gain = loudness_cache.get_gain(song) if guild_player.normalize else 1.0
+        use_effects = effects_active(guild_player, track_gain)
+        
+        # Lagu yang sering diputar langsung dari file cache, tanpa extraction
+        audio_key = get_audio_cache_key(song)
+        cached_path = audio_cache.get(audio_key)
+        cache_part = None
+        
+        if cached_path:
+            print(f"💽 Audio cache hit: {song.title}")
+        else:
+            # Pakai hasil resolve dari cache/prefetch jika masih valid (loop / loop_queue / lagu berikutnya)
+            guild_player.set_state(PlayerState.RESOLVING)
+            info = await resolve_stream(song, guild_id)
             
-            if not info or 'url' not in info:
-                raise Exception("No audio URL found")
+            # Lengkapi data placeholder dari playlist
+            if not song.thumbnail:
+                song.thumbnail = info.get('thumbnail')
+            if not song.duration and info.get('duration'):
+                song.duration = int(info['duration'])
             
             url = info['url']
             
@@ -281,158 +2397,86 @@ async def play_song(voice_client, song, ctx=None):
                 url = f"{url}?_nocache={timestamp}{random_str}&_start=0"
             
             print(f"🔗 Fresh URL: {url[:80]}...")
+            
+            # ====== PERBAIKAN 2: CEK JIKA URL VALID ======
+            if not url or url.strip() == '':
+                raise Exception("Invalid audio URL obtained")
+            
+            # FFMPEG OPTIONS dengan timeout yang lebih baik
+            ffmpeg_opts = get_ffmpeg_options(start_at)
+            
+            # Tulis Ogg/Opus ke cache sambil diputar (hanya jika diputar dari awal, tanpa stage efek)
+            codec = get_stream_codec(info)
+            if codec and start_at == 0 and not use_effects and audio_cache.is_cacheable(song):
+                cache_part = audio_cache.begin(audio_key)
+                ffmpeg_opts = audio_cache.tee_options(ffmpeg_opts, codec, cache_part)
         
-        # ====== PERBAIKAN 2: CEK JIKA URL VALID ======
-        if not url or url.strip() == '':
-            raise Exception("Invalid audio URL obtained")
+        if cached_path:
+            loudness_cache.schedule(audio_key, cached_path)
         
-        # FFMPEG OPTIONS dengan timeout yang lebih baik
-        ffmpeg_opts = {
-            'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -ss 0 -nostdin -timeout 60000000',
-            'options': '-vn -b:a 128k -bufsize 1024k'
-        }
+        # Track baru: callback dari track sebelumnya tidak boleh memicu play_next lagi
+        guild_player.track_token += 1
+        track_token = guild_player.track_token
         
         # Stop playback yang ada
         if voice_client.is_playing() or voice_client.is_paused():
             voice_client.stop()
-            await asyncio.sleep(0.5)
         
-        # ====== PERBAIKAN 3: FLAG UNTUK TRACK PLAYBACK STATE ======
-        playback_started = False
-        playback_error = None
+        if audio_nodes.enabled:
+            # ffmpeg, efek dan encoding Opus jalan di proses audio node
+            node_spec = {
+                'kind': 'pcm' if use_effects else ('cached' if cached_path else 'opus'),
+                'input': cached_path or url,
+                'start_at': start_at,
+                'ffmpeg': None if cached_path else ffmpeg_opts,
+                'codec': None if cached_path else get_stream_codec(info),
+            }
+            source = create_effects_source(guild_id, track_token, song, start_at, track_gain, node_spec=node_spec)
+        elif use_effects:
+            pcm_source = create_pcm_source(cached_path, start_at) if cached_path else create_pcm_source(url, ffmpeg_opts=ffmpeg_opts)
+            source = create_effects_source(guild_id, track_token, song, start_at, track_gain, pcm_source=pcm_source)
+        elif cached_path:
+            source = create_cached_audio_source(cached_path, start_at)
+        else:
+            # Buat audio source dari metadata extraction (ffprobe hanya fallback)
+            source = await create_audio_source(url, info, ffmpeg_opts)
         
-        # Buat audio source dengan timeout
-        try:
-            source = await discord.FFmpegOpusAudio.from_probe(
-                url,
-                **ffmpeg_opts,
-                timeout=30  # Timeout 30 detik
-            )
-        except Exception as e:
-            print(f"⚠️ FFmpegOpusAudio probe failed: {e}")
-            try:
-                source = discord.FFmpegPCMAudio(
-                    url,
-                    **ffmpeg_opts
-                )
-            except Exception as e2:
-                print(f"❌ FFmpegPCMAudio failed: {e2}")
-                raise Exception(f"Gagal membuat audio source: {e2}")
+        cache_commit = (audio_key, cache_part, song.duration) if cache_part else None
         
         # ====== PERBAIKAN 4: CALLBACK YANG LEBIH AMAN ======
         def after_playing(error):
-            """Callback setelah lagu selesai"""
-            nonlocal playback_started, playback_error
-            
+            """Callback setelah lagu selesai (dipanggil dari thread audio)"""
             print(f"🔔 After playing callback triggered. Error: {error}")
-            
-            # Jika belum pernah mulai playback, ini adalah error awal
-            if not playback_started:
-                print("⚠️ Callback triggered before playback started!")
-                playback_error = error
-                return  # JANGAN panggil play_next jika belum mulai!
-            
-            # Langsung panggil play_next untuk guild ini
             if error:
                 print(f"⚠️ Playback error: {error}")
-            
-            # Gunakan asyncio.run_coroutine_threadsafe untuk bot loop
-            async def play_next_wrapper():
-                try:
-                    print(f"🔄 Callback: Attempting to play next for guild {guild_id}")
-                    
-                    # TUNGGU 2 DETIK untuk memastikan state konsisten
-                    await asyncio.sleep(2)
-                    
-                    # Cek jika voice client masih connected
-                    voice_client_found = None
-                    for vc in bot.voice_clients:
-                        if vc.guild.id == guild_id and vc.is_connected():
-                            voice_client_found = vc
-                            break
-                    
-                    if not voice_client_found:
-                        print("❌ Voice client not found or disconnected")
-                        return
-                    
-                    # Cari text channel
-                    guild = voice_client_found.guild
-                    text_channel = None
-                    for channel in guild.text_channels:
-                        if channel.permissions_for(guild.me).send_messages:
-                            text_channel = channel
-                            break
-                    
-                    if text_channel:
-                        class FakeContext:
-                            def __init__(self):
-                                self.voice_client = voice_client_found
-                                self.guild = guild
-                                self.channel = text_channel
-                                self.author = guild.me
-                        
-                        fake_ctx = FakeContext()
-                        
-                        # TUNGGU LAGI untuk pastikan
-                        await asyncio.sleep(0.5)
-                        
-                        await play_next(fake_ctx)
-                        print(f"✅ Callback: Successfully triggered play_next")
-                    
-                except Exception as e:
-                    print(f"❌ Error in play_next_wrapper: {e}")
-                    import traceback
-                    traceback.print_exc()
-            
-            asyncio.run_coroutine_threadsafe(play_next_wrapper(), bot.loop)
+            asyncio.run_coroutine_threadsafe(on_track_end(guild_id, track_token, error, cache_commit), bot.loop)
         
-        # ====== PERBAIKAN 5: TRY-CATCH SAAT MEMULAI PLAYBACK ======
-        try:
-            # Set flag bahwa kita akan mulai playback
-            playback_started = True
-            
-            # Play dengan callback
-            voice_client.play(source, after=after_playing)
-            print(f"✅ Playing FRESH: {song.title}")
-            
-            # Update current song di guild player
-            guild_player = get_guild_player_by_id(guild_id)
-            if guild_player:
-                guild_player['current_song'] = song
-                guild_player['is_playing'] = True  # Tambah flag playing
-            
-            # ====== PERBAIKAN 6: VERIFIKASI PLAYBACK BENAR-BENAR MULAI ======
-            await asyncio.sleep(1)  # Tunggu 1 detik
-            
-            if not voice_client.is_playing():
-                print("⚠️ Playback didn't start after 1 second!")
-                if playback_error:
-                    raise Exception(f"Playback failed to start: {playback_error}")
-                else:
-                    # Coba stop dan start ulang
-                    voice_client.stop()
-                    await asyncio.sleep(0.5)
-                    
-                    # Coba buat source baru
-                    try:
-                        source2 = discord.FFmpegPCMAudio(url, **ffmpeg_opts)
-                        voice_client.play(source2, after=after_playing)
-                        print("🔄 Restarted playback with PCM")
-                    except Exception as restart_error:
-                        raise Exception(f"Failed to restart: {restart_error}")
-            
-            return True
-            
-        except Exception as play_error:
-            print(f"❌ Error starting playback: {play_error}")
-            playback_started = False
-            raise play_error
+        voice_client.play(source, after=after_playing)
+        print(f"✅ Playing FRESH: {song.title}")
+        
+        # Update current song di guild player
+        guild_player.current_song = song
+        guild_player.track_offset = start_at
+        guild_player.track_started_at = time.monotonic()
+        guild_player.set_state(PlayerState.PLAYING)
+        
+        # Resolve lagu berikutnya selagi lagu ini diputar
+        schedule_prefetch(guild_id)
+        return True
         
     except Exception as e:
         print(f"❌ Error in play_song: {e}")
         import traceback
         traceback.print_exc()
         
+        # Jangan pakai lagi stream URL yang gagal diputar
+        stream_cache.invalidate(song.webpage_url or song.url)
+        if cache_part:
+            audio_cache.discard(cache_part)
+        guild_player = get_guild_player_by_id(voice_client.guild.id)
+        if not voice_client.is_playing():
+            guild_player.set_state(PlayerState.IDLE)
+        
         # ====== PERBAIKAN 7: KIRIM PESAN ERROR KE CHANNEL ======
         if ctx and hasattr(ctx, 'channel'):
             try:
@@ -446,101 +2490,6 @@ async def play_song(voice_client, song, ctx=None):
         
         raise e
     
-# async def play_next(ctx=None, guild_id=None):
-#     """Play next song in queue - FIXED VERSION"""
-#     try:
-#         print("🎵 PLAY_NEXT called")
-        
-#         # Dapatkan guild_id
-#         if guild_id is None:
-#             if ctx is None:
-#                 print("❌ No context or guild_id provided")
-#                 return
-#             guild_id = ctx.guild.id
-#             voice_client = ctx.voice_client
-#         else:
-#             # Cari voice client berdasarkan guild_id
-#             voice_client = None
-#             for vc in bot.voice_clients:
-#                 if vc.guild.id == guild_id:
-#                     voice_client = vc
-#                     break
-            
-#             if not voice_client:
-#                 print(f"❌ No voice client for guild {guild_id}")
-#                 return
-        
-#         # Cek koneksi voice
-#         if not voice_client or not voice_client.is_connected():
-#             print(f"❌ Voice client not connected for guild {guild_id}")
-#             return
-        
-#         # Dapatkan guild player
-#         guild_player = guild_players.get(guild_id)
-#         if not guild_player:
-#             print(f"❌ No guild player for guild {guild_id}")
-#             return
-        
-#         print(f"🎵 PLAY_NEXT - Guild: {guild_id}")
-#         print(f"🎵 PLAY_NEXT - Current: {guild_player['current_song'].title if guild_player['current_song'] else 'None'}")
-#         print(f"🎵 PLAY_NEXT - Queue: {len(guild_player['queue'])} songs")
-        
-#         # Delay untuk menghindari race condition
-#         await asyncio.sleep(0.5)
-        
-#         # Reset skip flag jika ada
-#         if 'skip_requested' in guild_player:
-#             guild_player['skip_requested'] = False
-        
-#         # LOGIC PEMUTARAN - SEDERHANA DAN PASTI BEKERJA
-#         next_song = None
-        
-#         # 1. Cek jika loop aktif
-#         if guild_player.get('loop', False) and guild_player['current_song']:
-#             next_song = guild_player['current_song']
-#             print(f"🎵 PLAY_NEXT - Looping: {next_song.title}")
-        
-#         # 2. Cek jika ada queue
-#         elif guild_player['queue']:
-#             next_song = guild_player['queue'].pop(0)
-#             guild_player['current_song'] = next_song
-#             print(f"🎵 PLAY_NEXT - Playing next from queue: {next_song.title}")
-            
-#             # Jika loop queue aktif, tambahkan kembali ke akhir
-#             if guild_player.get('loop_queue', False):
-#                 guild_player['queue'].append(next_song)
-#                 print(f"🎵 PLAY_NEXT - Added to queue loop")
-        
-#         # 3. Tidak ada lagu berikutnya
-#         else:
-#             print(f"🎵 PLAY_NEXT - Queue empty")
-#             guild_player['current_song'] = None
-#             return
-        
-#         # Play lagu berikutnya
-#         if next_song:
-#             # Kirim pesan "Now Playing" jika ada context
-#             if ctx and hasattr(ctx, 'channel'):
-#                 try:
-#                     embed = discord.Embed(
-#                         description=f"🎶 Now playing: [{next_song.title}]({next_song.url})",
-#                         color=0x00ff00
-#                     )
-#                     embed.set_footer(text=f"Requested by {next_song.requester.display_name}")
-#                     if next_song.thumbnail:
-#                         embed.set_thumbnail(url=next_song.thumbnail)
-#                     await ctx.channel.send(embed=embed)
-#                 except Exception as e:
-#                     print(f"⚠️ Could not send now playing message: {e}")
-            
-#             # Play song dengan context
-#             await play_song(voice_client, next_song, ctx)
-            
-#     except Exception as e:
-#         print(f"❌ Error in play_next: {e}")
-#         import traceback
-#         traceback.print_exc()
-
 async def play_next(ctx=None, guild_id=None):
     """Play next song in queue dengan berbagai cara pemanggilan"""
     try:
@@ -555,11 +2504,7 @@ async def play_next(ctx=None, guild_id=None):
             guild_player = get_guild_player(ctx)
         else:
             # Cari voice client berdasarkan guild_id
-            voice_client = None
-            for vc in bot.voice_clients:
-                if vc.guild.id == guild_id:
-                    voice_client = vc
-                    break
+            voice_client = get_voice_client(guild_id)
             
             if not voice_client:
                 print(f"❌ PLAY_NEXT - No voice client for guild {guild_id}")
@@ -576,91 +2521,398 @@ async def play_next(ctx=None, guild_id=None):
             print(f"❌ PLAY_NEXT - Voice client not connected for guild {guild_id}")
             return
         
-        # Cek jika sedang dalam proses skip
-        if guild_player.get('skip_requested', False):
-            print(f"⚠️ PLAY_NEXT - Skip in progress for guild {guild_id}, aborting")
-            guild_player['skip_requested'] = False
+        async with guild_player.lock:
+            await _play_next_locked(ctx, guild_id, voice_client, guild_player)
+            
+    except Exception as e:
+        print(f"❌ Error in play_next: {e}")
+        import traceback
+        traceback.print_exc()
+
+async def announce_now_playing(guild_player, song, guild, ctx=None):
+    """Kirim embed 'Now playing' ke text channel guild"""
+    try:
+        # Get the text channel from guild_player (preferred) or from ctx
+        text_channel = None
+        
+        # Option 1: Use stored text channel
+        if guild_player.text_channel:
+            text_channel = guild_player.text_channel
+        # Option 2: Use ctx if available
+        elif ctx and hasattr(ctx, 'channel'):
+            text_channel = ctx.channel
+            # Also update the stored text channel
+            guild_player.text_channel = text_channel
+        # Option 3: Try to find any text channel the bot can send to
+        else:
+            # Get the first text channel the bot can send messages to
+            text_channel = get_announce_channel(guild)
+        
+        if text_channel:
+            embed = discord.Embed(
+                description=f"🎶 Now playing: [{song.title}]({song.url})",
+                color=0x00ff00
+            )
+            embed.set_footer(text=f"Requested by {song.requester_name(guild)}")
+            if song.thumbnail:
+                embed.set_thumbnail(url=song.thumbnail)
+            # Tidak di-await: playback tidak menunggu rate limit, now playing yang belum terkirim diganti
+            outbound.send(text_channel, embed=embed, supersede=('now_playing', guild.id))
+    except Exception as e:
+        print(f"⚠️ Could not send now playing message: {e}")
+
+async def _play_next_locked(ctx, guild_id, voice_client, guild_player):
+    """Bagian play_next yang berjalan dengan guild_player.lock"""
+    try:
+        # Track lain sudah dimulai selama menunggu lock (mis. n.play bersamaan)
+        if voice_client.is_playing() or voice_client.is_paused():
+            print(f"⚠️ PLAY_NEXT - Already playing in guild {guild_id}, nothing to do")
             return
         
         print(f"🎵 PLAY_NEXT - Guild: {guild_id}")
-        print(f"🎵 PLAY_NEXT - Current: {guild_player['current_song'].title if guild_player['current_song'] else 'None'}")
-        print(f"🎵 PLAY_NEXT - Queue: {len(guild_player['queue'])} songs")
-        print(f"🎵 PLAY_NEXT - Loop: {guild_player['loop']}, Loop Queue: {guild_player['loop_queue']}")
-        
-        # Delay kecil untuk menghindari race condition
-        await asyncio.sleep(0.5)
-        
-        # Cek jika masih playing (kadang callback dipanggil tapi masih playing)
-        if voice_client.is_playing():
-            print(f"⚠️ PLAY_NEXT - Still playing, waiting...")
-            await asyncio.sleep(1)
-            if voice_client.is_playing():
-                print(f"❌ PLAY_NEXT - Still playing after wait, aborting")
-                return
+        print(f"🎵 PLAY_NEXT - Current: {guild_player.current_song.title if guild_player.current_song else 'None'}")
+        print(f"🎵 PLAY_NEXT - Queue: {len(guild_player.queue)} songs")
+        print(f"🎵 PLAY_NEXT - Loop: {guild_player.loop}, Loop Queue: {guild_player.loop_queue}")
         
         # LOGIC PEMUTARAN
-        if guild_player['loop'] and guild_player['current_song']:
+        if guild_player.loop and guild_player.current_song:
             # Loop current song
-            current_song = guild_player['current_song']
+            current_song = guild_player.current_song
             print(f"🎵 PLAY_NEXT - Looping: {current_song.title}")
             await play_song(voice_client, current_song)
             
-        elif guild_player['queue']:
+        elif guild_player.queue:
             # Play next song in queue
-            next_song = guild_player['queue'].pop(0)
-            guild_player['current_song'] = next_song
+            next_song = guild_player.queue.pop(0)
+            guild_player.current_song = next_song
             print(f"🎵 PLAY_NEXT - Playing next: {next_song.title}")
             
             # Update status di text channel yang benar
-            try:
-                # Get the text channel from guild_player (preferred) or from ctx
-                text_channel = None
-                
-                # Option 1: Use stored text channel
-                if guild_player.get('text_channel'):
-                    text_channel = guild_player['text_channel']
-                # Option 2: Use ctx if available
-                elif ctx and hasattr(ctx, 'channel'):
-                    text_channel = ctx.channel
-                    # Also update the stored text channel
-                    guild_player['text_channel'] = text_channel
-                # Option 3: Try to find any text channel the bot can send to
-                else:
-                    # Get the first text channel the bot can send messages to
-                    guild = voice_client.guild
-                    for channel in guild.text_channels:
-                        if channel.permissions_for(guild.me).send_messages:
-                            text_channel = channel
-                            break
-                
-                if text_channel:
-                    embed = discord.Embed(
-                        description=f"🎶 Now playing: [{next_song.title}]({next_song.url})",
-                        color=0x00ff00
-                    )
-                    embed.set_footer(text=f"Requested by {next_song.requester.display_name if hasattr(next_song.requester, 'display_name') else 'Unknown'}")
-                    if next_song.thumbnail:
-                        embed.set_thumbnail(url=next_song.thumbnail)
-                    await text_channel.send(embed=embed)
-            except Exception as e:
-                print(f"⚠️ Could not send now playing message: {e}")
+            await announce_now_playing(guild_player, next_song, voice_client.guild, ctx)
             
             await play_song(voice_client, next_song)
             
             # Jika loop queue, tambahkan kembali ke akhir queue
-            if guild_player['loop_queue']:
-                guild_player['queue'].append(next_song)
+            if guild_player.loop_queue:
+                guild_player.queue.append(next_song)
                 print(f"🎵 PLAY_NEXT - Queue loop: added {next_song.title} to end")
                 
         else:
             # No more songs
             print(f"🎵 PLAY_NEXT - Queue empty for guild {guild_id}")
-            guild_player['current_song'] = None
+            guild_player.current_song = None
+            guild_player.set_state(PlayerState.IDLE)
             
     except Exception as e:
         print(f"❌ Error in play_next: {e}")
         import traceback
         traceback.print_exc()
+        if not voice_client.is_playing():
+            guild_player.set_state(PlayerState.IDLE)
+
+# ============================
+# QUEUE PERSISTENCE
+# ============================
+
+SNAPSHOT_DB_PATH = "music_state.db"
+SNAPSHOT_INTERVAL = 30  # Detik antar snapshot
+
+class QueueSnapshotStore:
+    """Snapshot incremental queue semua guild ke SQLite, dipakai untuk resume setelah restart"""
+
+    def __init__(self, path=SNAPSHOT_DB_PATH):
+        self.path = path
+        self.signatures = {}  # guild_id -> signature queue snapshot terakhir
+        self.positions = {}  # guild_id -> posisi playback yang terakhir ditulis
+        self.restored = False
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS guild_queues (
+                    guild_id INTEGER PRIMARY KEY,
+                    voice_channel_id INTEGER,
+                    text_channel_id INTEGER,
+                    loop INTEGER NOT NULL,
+                    loop_queue INTEGER NOT NULL,
+                    position REAL NOT NULL,
+                    current BLOB,
+                    queue BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @staticmethod
+    def encode_songs(songs):
+        """Pack entry (url, title, duration, requester_id) jadi blob JSON terkompresi"""
+        rows = [[song.webpage_url or song.url, song.title, song.duration, song.requester_id] for song in songs]
+        return zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def decode_songs(blob):
+        if not blob:
+            return []
+        return [Song.from_entry(*row) for row in json.loads(zlib.decompress(blob))]
+
+    def capture(self):
+        """Kumpulkan guild yang berubah sejak snapshot terakhir (jalan di event loop)
+
+        Queue hanya di-serialize ulang jika isi/loop/lagu berubah; posisi playback
+        ditulis terpisah dengan UPDATE kecil.
+        """
+        upserts, position_updates, deletes = [], [], []
+        seen = set()
+        for guild_id, guild_player in list(player.players.items()):
+            guild = bot.get_guild(guild_id)
+            voice_client = guild.voice_client if guild else None
+            if not voice_client or (not guild_player.current_song and not guild_player.queue):
+                continue
+
+            seen.add(guild_id)
+            position = round(guild_player.playback_position())
+            signature = (
+                id(guild_player.queue), guild_player.queue.version, id(guild_player.current_song),
+                guild_player.loop, guild_player.loop_queue, voice_client.channel.id,
+                guild_player.text_channel.id if guild_player.text_channel else None,
+            )
+            if self.signatures.get(guild_id) == signature:
+                if self.positions.get(guild_id) != position:
+                    self.positions[guild_id] = position
+                    position_updates.append((float(position), time.time(), guild_id))
+                continue
+
+            self.signatures[guild_id] = signature
+            self.positions[guild_id] = position
+            current = guild_player.current_song
+            upserts.append((
+                guild_id,
+                voice_client.channel.id,
+                guild_player.text_channel.id if guild_player.text_channel else None,
+                int(guild_player.loop),
+                int(guild_player.loop_queue),
+                float(position),
+                self.encode_songs([current]) if current else None,
+                self.encode_songs(guild_player.queue),
+                time.time(),
+            ))
+
+        for guild_id in list(self.signatures):
+            if guild_id not in seen:
+                del self.signatures[guild_id]
+                self.positions.pop(guild_id, None)
+                deletes.append((guild_id,))
+        return upserts, position_updates, deletes
+
+    def write(self, upserts, position_updates, deletes):
+        """Tulis perubahan dalam satu transaksi (atomic)"""
+        if not upserts and not position_updates and not deletes:
+            return
+        with self._write_lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO guild_queues VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", upserts
+            )
+            conn.executemany(
+                "UPDATE guild_queues SET position = ?, updated_at = ? WHERE guild_id = ?", position_updates
+            )
+            conn.executemany("DELETE FROM guild_queues WHERE guild_id = ?", deletes)
+
+    def load(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT guild_id, voice_channel_id, text_channel_id, loop, loop_queue, position, current, queue "
+                "FROM guild_queues"
+            ).fetchall()
+
+    def clear(self):
+        self.signatures.clear()
+        self.positions.clear()
+        with self._write_lock, self._connect() as conn:
+            conn.execute("DELETE FROM guild_queues")
+
+    async def snapshot(self):
+        upserts, position_updates, deletes = self.capture()
+        if upserts or position_updates or deletes:
+            await bot.loop.run_in_executor(io_executor, self.write, upserts, position_updates, deletes)
+
+    async def restore(self):
+        """Load snapshot, rebuild queue, lalu reconnect dan lanjutkan playback"""
+        if self.restored:
+            return
+        self.restored = True
+
+        started = time.perf_counter()
+        rows = await bot.loop.run_in_executor(io_executor, self.load)
+        resume_jobs = []
+        stale = []
+        for guild_id, voice_channel_id, text_channel_id, loop, loop_queue, position, current, queue_blob in rows:
+            if not owns_guild(guild_id):
+                continue  # Milik cluster lain
+            guild = bot.get_guild(guild_id)
+            channel = guild.get_channel(voice_channel_id) if guild else None
+            if not channel or not any(not m.bot for m in channel.members):
+                # Tidak di-resume sekarang = sesi lama, jangan hidup lagi di restart berikutnya
+                stale.append((guild_id,))
+                continue
+
+            guild_player = player.get_player(guild_id)
+            guild_player.queue = SongQueue(self.decode_songs(queue_blob))
+            current_songs = self.decode_songs(current)
+            guild_player.current_song = current_songs[0] if current_songs else None
+            guild_player.loop = bool(loop)
+            guild_player.loop_queue = bool(loop_queue)
+            guild_player.text_channel = guild.get_channel(text_channel_id) if text_channel_id else None
+            # Row dianggap sudah diketahui: jika resume gagal / queue habis, capture() berikutnya menghapusnya
+            self.signatures[guild_id] = None
+            resume_jobs.append(self._resume_guild(guild, channel, position))
+
+        if stale:
+            await bot.loop.run_in_executor(io_executor, self.write, [], [], stale)
+        print(f"💾 Restored {len(resume_jobs)} queues from snapshot in {(time.perf_counter() - started) * 1000:.0f}ms")
+        await asyncio.gather(*resume_jobs, return_exceptions=True)
+
+    async def _resume_guild(self, guild, channel, position):
+        guild_player = player.get_player(guild.id)
+        try:
+            voice_client = guild.voice_client or await channel.connect()
+            async with guild_player.lock:
+                if guild_player.current_song:
+                    await play_song(voice_client, guild_player.current_song, start_at=position)
+                else:
+                    await _play_next_locked(None, guild.id, voice_client, guild_player)
+            print(f"✅ Resumed queue for guild {guild.id}")
+        except Exception as e:
+            print(f"⚠️ Failed to resume guild {guild.id}: {e}")
+
+queue_snapshots = QueueSnapshotStore()
+
+async def periodic_queue_snapshot():
+    """Background task snapshot queue"""
+    await bot.wait_until_ready()
+    while not bot.is_closed():
+        try:
+            await queue_snapshots.snapshot()
+        except Exception as e:
+            print(f"[Snapshot Error] {e}")
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+
+# ============================
+# LOUDNESS NORMALIZATION
+# ============================
+
+LOUDNESS_TARGET_LUFS = -14.0  # Referensi loudness YouTube / Spotify
+LOUDNESS_MAX_BOOST_DB = 6.0
+LOUDNESS_MAX_CUT_DB = -15.0
+LOUDNESS_MIN_ADJUST_DB = 1.0  # Selisih kecil diabaikan supaya tetap Opus passthrough
+LOUDNESS_WORKERS = int(os.environ.get('REIKA_LOUDNESS_WORKERS', 2))  # Proses ffmpeg analisis paralel
+LOUDNORM_JSON_PATTERN = re.compile(r'\{[^{}]*"input_i"[^{}]*\}')
+
+class LoudnessCache:
+    """Integrated loudness (EBU R128) per video, diukur sekali di background lalu disimpan di SQLite"""
+
+    def __init__(self, path=SNAPSHOT_DB_PATH, workers=LOUDNESS_WORKERS):
+        self.path = path
+        self.workers = workers
+        self.measurements = {}  # cache key -> (integrated LUFS, true peak dBTP)
+        self.pending = {}  # cache key -> task analisis yang sedang jalan
+        self.semaphore = None
+        self.analyzed = 0
+        self.failed = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS loudness (
+                    cache_key TEXT PRIMARY KEY,
+                    integrated REAL NOT NULL,
+                    true_peak REAL NOT NULL,
+                    measured_at REAL NOT NULL
+                )
+            """)
+            for key, integrated, true_peak in conn.execute(
+                "SELECT cache_key, integrated, true_peak FROM loudness"
+            ):
+                self.measurements[key] = (integrated, true_peak)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get_gain(self, song):
+        """Gain linear untuk mencapai target loudness, 1.0 jika belum diukur"""
+        measurement = self.measurements.get(get_audio_cache_key(song))
+        if not measurement:
+            return 1.0
+        integrated, true_peak = measurement
+        gain_db = max(LOUDNESS_MAX_CUT_DB, min(LOUDNESS_MAX_BOOST_DB, LOUDNESS_TARGET_LUFS - integrated))
+        if gain_db > 0:
+            # Jangan boost melewati -1 dBTP, sisanya biar limiter yang handle
+            gain_db = min(gain_db, max(0.0, -1.0 - true_peak))
+        if abs(gain_db) < LOUDNESS_MIN_ADJUST_DB:
+            return 1.0
+        return 10 ** (gain_db / 20)
+
+    def schedule(self, key, path):
+        """Analisis loudness file cache di background jika key belum pernah diukur (tanpa fetch ulang stream)"""
+        if not NUMPY_AVAILABLE or key in self.measurements or key in self.pending:
+            return
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+        self.pending[key] = asyncio.get_running_loop().create_task(self._analyze(key, path))
+
+    async def _analyze(self, key, path):
+        try:
+            async with self.semaphore:
+                args = [
+                    'ffmpeg', '-nostdin', '-hide_banner', '-nostats', '-threads', '1',
+                    '-i', path, '-vn',
+                    '-af', f'loudnorm=I={LOUDNESS_TARGET_LUFS}:TP=-1:print_format=json',
+                    '-f', 'null', '-',
+                ]
+                process = await asyncio.create_subprocess_exec(
+                    *args,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+            
+            match = LOUDNORM_JSON_PATTERN.search(stderr.decode('utf-8', 'ignore'))
+            if not match:
+                raise ValueError(f"ffmpeg exit {process.returncode}, no loudnorm output")
+            data = json.loads(match.group(0))
+            integrated = float(data['input_i'])
+            true_peak = float(data['input_tp'])
+            if not (-70.0 < integrated < 10.0):
+                raise ValueError(f"integrated loudness out of range ({integrated})")
+            
+            self.measurements[key] = (integrated, true_peak)
+            self.analyzed += 1
+            print(f"📏 Loudness {key}: {integrated:.1f} LUFS, {true_peak:.1f} dBTP")
+            await asyncio.get_running_loop().run_in_executor(
+                io_executor, self._write, (key, integrated, true_peak, time.time())
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"⚠️ Loudness analysis failed for {key}: {e}")
+        finally:
+            self.pending.pop(key, None)
+
+    def _write(self, row):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO loudness VALUES (?, ?, ?, ?)", row)
+
+    def get_stats(self):
+        return {
+            'measured': len(self.measurements),
+            'pending': len(self.pending),
+            'analyzed': self.analyzed,
+            'failed': self.failed,
+        }
+
+loudness_cache = LoudnessCache()
 
 # ============================
 # MEDIA DOWNLOAD FUNCTIONS
@@ -676,7 +2928,7 @@ async def upload_to_puticu(path: str):
     except:
         file_size = 0
 
-    async with aiohttp.ClientSession() as session:
+    async with http_client.session() as session:
         with open(path, "rb") as f:
             async with session.put(
                 UPLOAD_URL, 
@@ -695,123 +2947,207 @@ async def upload_to_puticu(path: str):
                 return data.get("direct_url")  # URL akhir
 
 
-async def download_media(ctx, url, mode):
-    """Download media lalu upload otomatis ke put.icu"""
-    if not YTDL_AVAILABLE:
-        await ctx.send("❌ yt-dlp not available. Download features disabled.")
+STREAM_UPLOADS_ENABLED = os.environ.get('REIKA_STREAM_UPLOADS', '1') != '0'
+STREAM_UPLOAD_CHUNK = 256 * 1024
+STREAM_UPLOAD_BUFFER_CHUNKS = 32  # Maksimal ~8 MB di memori antara download dan upload
+STREAMABLE_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+MP4_STREAM_CODECS = ('avc1', 'avc3', 'h264', 'hev1', 'hvc1', 'mp4a', 'aac', 'none')
+
+def ffmpeg_input_args(fmt):
+    """Argumen input ffmpeg untuk satu format yt-dlp (termasuk HTTP headers)"""
+    args = []
+    headers = fmt.get('http_headers') or {}
+    if headers:
+        args += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in headers.items())]
+    if fmt.get('protocol') in ('http', 'https'):
+        args += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5']
+    return args + ['-i', fmt['url']]
+
+def plan_stream_upload(info, mode):
+    """Cara streaming hasil download ke upload tanpa file di disk, None jika butuh file (merge/convert tidak bisa di-pipe)"""
+    formats = info.get('requested_formats') or [info]
+    if not all(fmt.get('url') and fmt.get('protocol') in STREAMABLE_PROTOCOLS for fmt in formats):
+        return None
+    name = re.sub(r'[^\w.-]', '_', str(info.get('id') or 'media'))
+    
+    if mode == 'ytmp3':
+        args = ffmpeg_input_args(formats[-1]) + ['-vn', '-c:a', 'libmp3lame', '-b:a', '192k', '-f', 'mp3', 'pipe:1']
+        return {'kind': 'ffmpeg', 'args': args, 'filename': f"{name}.mp3"}
+    
+    if len(formats) == 1 and formats[0].get('protocol') in ('http', 'https'):
+        # File progressive: byte dari sumber langsung diteruskan ke upload
+        ext = formats[0].get('ext') or info.get('ext') or 'mp4'
+        return {'kind': 'http', 'format': formats[0], 'filename': f"{name}.{ext}"}
+    
+    # Merge video+audio / HLS: remux ke fragmented MP4 (bisa ditulis ke pipe) jika codec cocok
+    codecs = [(fmt.get('vcodec') or 'none', fmt.get('acodec') or 'none') for fmt in formats]
+    if not all(codec.split('.')[0] in MP4_STREAM_CODECS for pair in codecs for codec in pair):
+        return None
+    args = []
+    for fmt in formats:
+        args += ffmpeg_input_args(fmt)
+    for index in range(len(formats)):
+        args += ['-map', str(index)]
+    args += ['-c', 'copy', '-f', 'mp4', '-movflags', 'frag_keyframe+empty_moov', 'pipe:1']
+    return {'kind': 'ffmpeg', 'args': args, 'filename': f"{name}.mp4"}
+
+async def pump_stream_source(plan, buffer):
+    """Isi buffer dengan chunk dari sumber HTTP atau stdout ffmpeg"""
+    if plan['kind'] == 'http':
+        fmt = plan['format']
+        async with http_client.session() as session:
+            async with session.get(
+                fmt['url'],
+                headers=fmt.get('http_headers'),
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=120)
+            ) as resp:
+                resp.raise_for_status()
+                async for chunk in resp.content.iter_chunked(STREAM_UPLOAD_CHUNK):
+                    await buffer.put(chunk)
         return
+    
+    process = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', *plan['args'],
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        while True:
+            chunk = await process.stdout.read(STREAM_UPLOAD_CHUNK)
+            if not chunk:
+                break
+            await buffer.put(chunk)
+        if await process.wait() != 0:
+            raise Exception(f"ffmpeg exited with code {process.returncode}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
 
-    processing_msg = await ctx.send("⏳ Sedang memproses permintaanmu...")
-
+async def stream_upload_to_puticu(plan):
+    """Upload ke put.icu sambil download berjalan (chunked body dari buffer terbatas)"""
+    buffer = asyncio.Queue(maxsize=STREAM_UPLOAD_BUFFER_CHUNKS)
+    
+    async def produce():
+        cancelled = False
+        try:
+            await pump_stream_source(plan, buffer)
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        finally:
+            # Saat dibatalkan upload sudah berhenti: tidak ada yang menunggu sentinel (dan buffer bisa penuh)
+            if not cancelled:
+                await buffer.put(None)
+    
+    async def body():
+        while True:
+            chunk = await buffer.get()
+            if chunk is None:
+                return
+            yield chunk
+    
+    # Body generator tidak punya nama file: set tipe media dan nama secara eksplisit seperti upload dari disk
+    filename = plan['filename']
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+    producer = asyncio.get_running_loop().create_task(produce())
+    try:
+        async with http_client.session() as session:
+            async with session.put(
+                UPLOAD_URL,
+                data=body(),
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=120)
+            ) as resp:
+                if resp.status != 200:
+                    return None
+                try:
+                    data = await resp.json()
+                except:
+                    return None
+        # Upload selesai tapi sumber error = file terpotong, jangan dipakai
+        await producer
+        return data.get("direct_url")
+    finally:
+        if not producer.done():
+            producer.cancel()
+        # Tunggu producer benar-benar selesai (ffmpeg di-kill), error-nya sudah ditangani di atas
+        await asyncio.gather(producer, return_exceptions=True)
+
+def get_downloaded_filepath(info):
+    """Path final hasil download (setelah post-processor, mis. konversi mp3) dari info yt-dlp"""
+    if info.get('entries'):
+        info = next((entry for entry in info['entries'] if entry), {})
+    for download in info.get('requested_downloads') or []:
+        if download.get('filepath'):
+            return download['filepath']
+    return info.get('filepath') or info.get('_filename')
+
+class MediaDownloadError(Exception):
+    """Error download yang pesannya ditampilkan langsung ke user"""
+
+async def run_download(url, mode, guild_id, on_status):
+    """Extract lalu upload ke put.icu (streaming atau via disk), return URL hasil upload"""
     # Generate unique ID untuk file ini
     unique_id = str(uuid.uuid4())[:8]  # 8 karakter pertama dari UUID
     base_filename = f"temp_download_{unique_id}"
     
-    # Template path dengan nama unik
+    # Template path dengan nama unik (di-override per checkout dari pool)
     outtmpl_template = os.path.join(DOWNLOADS_PATH, f'{base_filename}.%(ext)s')
-    
-    ydl_opts = {
-        'outtmpl': outtmpl_template,  # Gunakan template dengan ID unik
-        'quiet': True,
-        'noplaylist': True,
-        'no_warnings': True,
-    }
+    overrides = {'outtmpl': {'default': outtmpl_template}}
+    profile = f'download_{mode}'
 
-    if mode == 'yt':
-        ydl_opts.update({
-            'format': 'best[height<=1080]/best[ext=mp4]',
-            'merge_output_format': 'mp4'
-        })
-    elif mode == 'ytmp3':
-        ydl_opts.update({
-            'format': 'bestaudio/best',
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }]
-        })
-    elif mode in ['fb', 'ig']:
-        ydl_opts.update({
-            'format': 'best[ext=mp4]/best',
-            'merge_output_format': 'mp4'
-        })
-    else:
-        await ctx.send("🚫 Mode tidak dikenal. Gunakan: `yt`, `ytmp3`, `fb`, atau `ig`.")
-        return
+    async def on_queued(position):
+        on_status(f"⏳ Bot sedang sibuk, posisi antrian: **{position}**")
 
     # Variabel untuk menyimpan info file
     downloaded_filename = None
     
     try:
-        loop = asyncio.get_event_loop()
-        ydl = youtube_dl.YoutubeDL(ydl_opts)
-        
-        # Ekstrak info tanpa download dulu untuk mendapatkan ekstensi
-        info = await loop.run_in_executor(None, lambda: ydl.extract_info(url, download=False))
-        is_music = 'music.youtube.com' in url.lower() or info.get('extractor') == 'youtube:tab'
-        
-        # Dapatkan ekstensi file dari info
-        original_ext = info.get('ext', 'mp4')  # Default ke mp4 jika tidak ada
-        
-        # Tentukan ekstensi berdasarkan mode
-        if mode == 'ytmp3':
-            expected_ext = 'mp3'
-            downloaded_filename = os.path.join(DOWNLOADS_PATH, f'{base_filename}.mp3')
-        else:
-            expected_ext = original_ext if original_ext in ['mp4', 'webm', 'mkv'] else 'mp4'
-            downloaded_filename = os.path.join(DOWNLOADS_PATH, f'{base_filename}.{expected_ext}')
-        
-        # Download file
-        await loop.run_in_executor(None, lambda: ydl.extract_info(url, download=True))
-        
-        # Coba cari file dengan berbagai kemungkinan ekstensi
-        if not os.path.exists(downloaded_filename):
-            # Cari file dengan pattern yang cocok
-            possible_files = []
-            for file in os.listdir(DOWNLOADS_PATH):
-                if file.startswith(base_filename):
-                    possible_files.append(file)
-            
-            if possible_files:
-                # Ambil file pertama yang ditemukan
-                downloaded_filename = os.path.join(DOWNLOADS_PATH, possible_files[0])
-            else:
-                # Fallback: cari file dengan ekstensi umum
-                for ext in ['mp4', 'mp3', 'webm', 'mkv', 'm4a']:
-                    fallback_path = os.path.join(DOWNLOADS_PATH, f'{base_filename}.{ext}')
-                    if os.path.exists(fallback_path):
-                        downloaded_filename = fallback_path
-                        break
-        
-        if not os.path.exists(downloaded_filename):
-            await ctx.send("❌ File hasil unduhan tidak ditemukan.")
-            return
-
-        title = info.get('title', 'Unknown Title')
-        webpage_url = info.get('webpage_url', url)
-        thumbnail = info.get('thumbnail')
+        # Satu kali extract; hasilnya dipakai untuk streaming atau download ke disk
+        info = await media_scheduler.run(
+            guild_id,
+            lambda: ytdl_pool.extract(profile, url, overrides=overrides),
+            on_queued
+        )
+        if info and info.get('entries'):
+            info = next((entry for entry in info['entries'] if entry), None)
+        if not info:
+            raise MediaDownloadError("❌ Gagal mengambil media dari link tersebut.")
 
         # ============================
         # 📤 UPLOAD KE PUT.ICU
         # ============================
-        # await processing_msg.edit(content="📤 Mengupload ke server...")
-
-        uploaded_url = await upload_to_puticu(downloaded_filename)
+        on_status("📤 Mengupload ke server...")
 
+        uploaded_url = None
+        plan = plan_stream_upload(info, mode) if STREAM_UPLOADS_ENABLED else None
+        if plan:
+            try:
+                uploaded_url = await stream_upload_to_puticu(plan)
+            except Exception as e:
+                print(f"⚠️ Streaming upload failed, falling back to disk: {e}")
+        
         if not uploaded_url:
-            await processing_msg.edit(content="❌ Upload gagal.")
-            return
-
-        # ============================
-        # 📦 KIRIM EMBED + LINK
-        # ============================
-        await processing_msg.edit(content=uploaded_url)
+            # Merge/convert yang butuh file, atau streaming gagal: download ke disk dari info yang sama
+            extracted = info
+            info = await media_scheduler.run(
+                guild_id,
+                lambda: ytdl_pool.run(profile, lambda ydl: ydl.process_ie_result(extracted, download=True), overrides),
+                on_queued
+            )
+            downloaded_filename = get_downloaded_filepath(info) if info else None
+            if not downloaded_filename or not os.path.exists(downloaded_filename):
+                raise MediaDownloadError("❌ File hasil unduhan tidak ditemukan.")
+            uploaded_url = await upload_to_puticu(downloaded_filename)
 
-    except Exception as e:
-        await ctx.send(f"❌ Terjadi error: `{e}`")
-        import traceback
-        print(f"Error details: {traceback.format_exc()}")
+        if not uploaded_url:
+            raise MediaDownloadError("❌ Upload gagal.")
+        return uploaded_url
 
     finally:
         # Bersihkan file yang diunduh
@@ -821,18 +3157,315 @@ async def download_media(ctx, url, mode):
                 print(f"Cleaned up: {downloaded_filename}")
             
             # Juga bersihkan file lain dengan base_filename yang sama
-            if 'base_filename' in locals():
-                pattern = os.path.join(DOWNLOADS_PATH, f"{base_filename}.*")
-                import glob
-                for leftover_file in glob.glob(pattern):
-                    try:
-                        os.remove(leftover_file)
-                        print(f"Cleaned up leftover: {leftover_file}")
-                    except:
-                        pass
+            pattern = os.path.join(DOWNLOADS_PATH, f"{base_filename}.*")
+            import glob
+            for leftover_file in glob.glob(pattern):
+                try:
+                    os.remove(leftover_file)
+                    print(f"Cleaned up leftover: {leftover_file}")
+                except:
+                    pass
         except Exception as cleanup_error:
             print(f"Cleanup error: {cleanup_error}")
-        
+
+# ============================
+# DOWNLOAD JOB SCHEDULER
+# ============================
+
+DOWNLOAD_WORKERS = int(os.environ.get('REIKA_DOWNLOAD_WORKERS', 3))  # Job download+upload bersamaan
+DOWNLOAD_PER_USER_RUNNING = 1
+DOWNLOAD_PER_GUILD_RUNNING = 2
+DOWNLOAD_PER_USER_PENDING = 3  # Maksimal job aktif (antri + jalan) per user
+DOWNLOAD_QUEUE_LIMIT = 30
+DOWNLOAD_HISTORY_SIZE = 10
+
+class DownloadJob:
+    """Satu job download; beberapa request dengan URL + mode yang sama ikut ke job ini"""
+
+    def __init__(self, job_id, key, url, mode, guild_id, user_id, runner):
+        self.id = job_id
+        self.key = key
+        self.url = url
+        self.mode = mode
+        self.runner = runner  # Coroutine function runner(job) -> hasil untuk semua requester
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.messages = []  # Status message semua requester
+        self.state = 'queued'  # queued, running, done, failed
+        self.status_text = None
+        self.position = 0
+        self.created_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.future = asyncio.get_running_loop().create_future()
+        # Awaiter bisa batal semua, exception tetap dianggap sudah diambil
+        self.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    def set_status(self, text):
+        """Update status ke semua requester (lewat outbound, edit digabung per pesan)"""
+        self.status_text = text
+        for message in self.messages:
+            outbound.edit(message, content=text)
+
+class DownloadJobScheduler:
+    """Antrian job download: batas global, per user dan per guild, plus single-flight per URL + mode"""
+
+    def __init__(self, max_workers=DOWNLOAD_WORKERS, per_user_running=DOWNLOAD_PER_USER_RUNNING,
+                 per_guild_running=DOWNLOAD_PER_GUILD_RUNNING, per_user_pending=DOWNLOAD_PER_USER_PENDING,
+                 queue_limit=DOWNLOAD_QUEUE_LIMIT):
+        self.max_workers = max_workers
+        self.per_user_running = per_user_running
+        self.per_guild_running = per_guild_running
+        self.per_user_pending = per_user_pending
+        self.queue_limit = queue_limit
+        self.next_id = 1
+        self.inflight = {}  # (mode, url) -> job antri/jalan
+        self.waiting = deque()
+        self.running = []
+        self.history = deque(maxlen=DOWNLOAD_HISTORY_SIZE)
+        self.stats = {'submitted': 0, 'deduplicated': 0, 'completed': 0, 'failed': 0, 'rejected': 0}
+
+    def _count(self, jobs, attr, value):
+        return sum(1 for job in jobs if getattr(job, attr) == value)
+
+    def _has_capacity(self, job):
+        return (len(self.running) < self.max_workers
+                and self._count(self.running, 'user_id', job.user_id) < self.per_user_running
+                and self._count(self.running, 'guild_id', job.guild_id) < self.per_guild_running)
+
+    async def submit(self, url, mode, guild_id, user_id, message, runner=None):
+        """Daftarkan request dan tunggu hasilnya (default: URL upload put.icu), job sama dipakai bersama"""
+        key = (mode, url.strip())
+        job = self.inflight.get(key)
+        if job:
+            self.stats['deduplicated'] += 1
+            job.messages.append(message)
+            if job.status_text:
+                outbound.edit(message, content=job.status_text)
+        else:
+            if len(self.waiting) >= self.queue_limit:
+                self.stats['rejected'] += 1
+                raise ExtractionBusyError(f"Bot sedang sibuk, antrian download penuh ({len(self.waiting)} job)")
+            if self._count(self.inflight.values(), 'user_id', user_id) >= self.per_user_pending:
+                self.stats['rejected'] += 1
+                raise MediaDownloadError(f"⚠️ Kamu masih punya {self.per_user_pending} download yang berjalan, tunggu dulu ya.")
+
+            job = DownloadJob(self.next_id, key, url.strip(), mode, guild_id, user_id, runner or run_download_job)
+            self.next_id += 1
+            job.messages.append(message)
+            self.inflight[key] = job
+            self.waiting.append(job)
+            self.stats['submitted'] += 1
+            self._dispatch()
+
+        return await asyncio.shield(job.future)
+
+    def _dispatch(self):
+        """Jalankan job antri yang kuotanya tersedia, lalu update posisi antrian"""
+        for job in list(self.waiting):
+            if len(self.running) >= self.max_workers:
+                break
+            if self._has_capacity(job):
+                self.waiting.remove(job)
+                self.running.append(job)
+                job.state = 'running'
+                job.started_at = time.monotonic()
+                job.set_status("⏳ Sedang memproses permintaanmu...")
+                asyncio.get_running_loop().create_task(self._run(job))
+
+        for position, job in enumerate(self.waiting, start=1):
+            if job.position != position:
+                job.position = position
+                job.set_status(f"⏳ Antrian download, posisi: **{position}**")
+
+    async def _run(self, job):
+        try:
+            result = await job.runner(job)
+        except Exception as e:
+            job.state = 'failed'
+            self.stats['failed'] += 1
+            job.future.set_exception(e)
+        else:
+            job.state = 'done'
+            self.stats['completed'] += 1
+            job.future.set_result(result)
+        finally:
+            if not job.future.done():
+                # Task dibatalkan (mis. bot shutdown): requester yang menunggu tetap dapat jawaban
+                job.state = 'failed'
+                self.stats['failed'] += 1
+                job.future.set_exception(MediaDownloadError("❌ Download dibatalkan."))
+            job.finished_at = time.monotonic()
+            self.running.remove(job)
+            if self.inflight.get(job.key) is job:
+                del self.inflight[job.key]
+            self.history.appendleft(job)
+            self._dispatch()
+
+    def get_jobs(self):
+        return list(self.running), list(self.waiting), list(self.history)
+
+    def get_stats(self):
+        return {
+            'running': len(self.running),
+            'waiting': len(self.waiting),
+            **self.stats,
+        }
+
+download_jobs = DownloadJobScheduler()
+
+async def run_download_job(job):
+    """Runner default: download lalu upload ke put.icu"""
+    return await run_download(job.url, job.mode, job.guild_id, job.set_status)
+
+async def download_media(ctx, url, mode):
+    """Download media lalu upload otomatis ke put.icu"""
+    if not YTDL_AVAILABLE:
+        await ctx.send("❌ yt-dlp not available. Download features disabled.")
+        return
+
+    if mode not in DOWNLOAD_FORMAT_OPTIONS:
+        await ctx.send("🚫 Mode tidak dikenal. Gunakan: `yt`, `ytmp3`, `fb`, atau `ig`.")
+        return
+
+    processing_msg = await ctx.send("⏳ Sedang memproses permintaanmu...")
+    guild_id = ctx.guild.id if ctx.guild else None
+
+    try:
+        uploaded_url = await download_jobs.submit(url, mode, guild_id, ctx.author.id, processing_msg)
+    except (MediaDownloadError, ExtractionBusyError) as e:
+        outbound.edit(processing_msg, content=str(e) if isinstance(e, MediaDownloadError) else f"⏳ {e}")
+        return
+    except Exception as e:
+        await ctx.send(f"❌ Terjadi error: `{e}`")
+        print(f"Error details: {traceback.format_exc()}")
+        return
+
+    # ============================
+    # 📦 KIRIM LINK
+    # ============================
+    outbound.edit(processing_msg, content=uploaded_url)
+
+GOFILE_SERVER_URL = "https://api.gofile.io/getServer"
+DISCORD_ATTACHMENT_LIMIT = 25 * 1024 * 1024
+UPLOAD_PROGRESS_INTERVAL = 2.0  # Detik antar update progress
+
+def format_size(num_bytes):
+    return f"{num_bytes / (1024 * 1024):.1f} MB"
+
+async def upload_to_gofile(path, on_progress=None):
+    """Upload file ke GoFile.io secara streaming (multipart), return link download atau None"""
+    async with http_client.session() as session:
+        async with session.get(GOFILE_SERVER_URL) as resp:
+            server_info = await resp.json(content_type=None)
+        if server_info.get("status") != "ok":
+            return None
+        server = server_info["data"]["server"]
+
+        file_size = os.path.getsize(path)
+
+        async def body():
+            sent = 0
+            last_report = 0.0
+            with open(path, "rb") as f:
+                while True:
+                    chunk = await asyncio.get_running_loop().run_in_executor(io_executor, f.read, STREAM_UPLOAD_CHUNK)
+                    if not chunk:
+                        return
+                    sent += len(chunk)
+                    if on_progress and time.monotonic() - last_report >= UPLOAD_PROGRESS_INTERVAL:
+                        last_report = time.monotonic()
+                        on_progress(sent, file_size)
+                    yield chunk
+
+        form = aiohttp.FormData()
+        form.add_field("file", body(), filename=os.path.basename(path), content_type="video/mp4")
+        async with session.post(
+            f"https://{server}.gofile.io/uploadFile",
+            data=form,
+            timeout=aiohttp.ClientTimeout(total=None, sock_read=120)
+        ) as resp:
+            try:
+                response = await resp.json(content_type=None)
+            except Exception:
+                return None
+
+    if response.get("status") != "ok":
+        return None
+    return response["data"]["downloadPage"]
+
+async def run_twitter_job(job):
+    """Runner n.twitter: download, lalu kirim file ke semua requester atau upload ke GoFile jika terlalu besar"""
+    # Nama file unik per job supaya download bersamaan tidak saling timpa
+    base_filename = f"twitter_{uuid.uuid4().hex[:8]}"
+    overrides = {'outtmpl': {'default': os.path.join(DOWNLOADS_PATH, f'{base_filename}.%(ext)s')}}
+
+    async def on_queued(position):
+        job.set_status(f"⏳ Bot sedang sibuk, posisi antrian: **{position}**")
+
+    try:
+        info = await media_scheduler.run(
+            job.guild_id,
+            lambda: ytdl_pool.extract('download_twitter', job.url, download=True, overrides=overrides),
+            on_queued
+        )
+        filename = get_downloaded_filepath(info) if info else None
+        if not filename or not os.path.exists(filename):
+            raise MediaDownloadError("❌ Gagal mendownload video Twitter: file hasil unduhan tidak ditemukan.")
+
+        if os.path.getsize(filename) <= DISCORD_ATTACHMENT_LIMIT:
+            # Requester yang ikut job ini selama pengiriman juga dapat file-nya
+            sent = 0
+            while sent < len(job.messages):
+                message = job.messages[sent]
+                sent += 1
+                try:
+                    await message.channel.send("✅ Video berhasil diunduh!", file=File(filename))
+                except Exception as e:
+                    print(f"⚠️ Failed to send twitter video to channel {message.channel.id}: {e}")
+            return "✅ Video berhasil diunduh!"
+
+        job.set_status("⚠️ File terlalu besar, sedang diupload ke GoFile.io...")
+
+        def on_progress(sent, total):
+            job.set_status(
+                f"📤 Upload ke GoFile.io: **{sent * 100 // total}%** ({format_size(sent)} / {format_size(total)})"
+            )
+
+        download_link = await upload_to_gofile(filename, on_progress)
+        if not download_link:
+            raise MediaDownloadError("❌ Gagal mengupload video ke GoFile.io.")
+        return f"📦 Video terlalu besar, tapi sudah diupload!\n🔗 {download_link}"
+
+    finally:
+        import glob
+        for leftover_file in glob.glob(os.path.join(DOWNLOADS_PATH, f"{base_filename}.*")):
+            try:
+                os.remove(leftover_file)
+            except OSError:
+                pass
+
+@bot.command(name="twitter")
+async def download_twitter(ctx, url: str):
+    """Download video dari Twitter (X)"""
+    if not YTDL_AVAILABLE:
+        await ctx.send("❌ yt-dlp not available. Download features disabled.")
+        return
+
+    processing_msg = await ctx.send("🐦 Sedang memproses video Twitter...")
+    guild_id = ctx.guild.id if ctx.guild else None
+
+    try:
+        result = await download_jobs.submit(url, 'twitter', guild_id, ctx.author.id, processing_msg, run_twitter_job)
+    except (MediaDownloadError, ExtractionBusyError) as e:
+        outbound.edit(processing_msg, content=str(e) if isinstance(e, MediaDownloadError) else f"⏳ {e}")
+        return
+    except Exception as e:
+        await ctx.send(f"❌ Gagal mendownload video Twitter: `{e}`")
+        return
+
+    outbound.edit(processing_msg, content=result)
+
 # ============================
 # GIF CONVERSION FUNCTIONS
 # ============================
@@ -1107,29 +3740,69 @@ async def on_ready():
 async def on_voice_state_update(member, before, after):
     """Auto-disconnect jika sendirian di voice channel"""
     try:
+        # Timer idle saat bot join/keluar
+        if member == bot.user:
+            if after.channel and member.guild.voice_client:
+                if not before.channel:
+                    # Baru connect (mis. n.join) tapi belum ada yang diputar: idle timer mulai dari sekarang
+                    guild_player = player.players.get(member.guild.id)
+                    if not guild_player or guild_player.state is PlayerState.IDLE:
+                        idle_timers.arm(member.guild.id, IdleVoiceTimers.IDLE, VOICE_IDLE_TIMEOUT)
+            elif not after.channel:
+                idle_timers.cancel(member.guild.id)
+        
         # Case 1: Bot sendiri yang disconnect
         if member == bot.user and not after.channel:
             if before.channel:
                 guild_id = before.channel.guild.id
-                player.clear_guild(guild_id)
-    
-        # Case 2: Member lain keluar dari channel
-        if member != bot.user and before.channel and not after.channel:
-            voice_client = discord.utils.get(bot.voice_clients, guild=member.guild)
-            if voice_client and voice_client.channel == before.channel:
-                if len(voice_client.channel.members) == 1:
-                    guild_id = member.guild.id
+                if not get_guild_player_by_id(guild_id).reconnecting:
                     player.clear_guild(guild_id)
-                    
-                    if voice_client.is_playing() or voice_client.is_paused():
-                        voice_client.stop()
-                    
-                    await asyncio.sleep(1)
-                    await voice_client.disconnect()
+    
+        # Case 2: Member lain keluar / masuk channel bot (pindah antar channel lain diabaikan)
+        if member != bot.user and before.channel != after.channel:
+            voice_client = get_voice_client(member.guild.id)
+            if voice_client and voice_client.channel in (before.channel, after.channel):
+                if after.channel == voice_client.channel:
+                    idle_timers.cancel(member.guild.id, IdleVoiceTimers.ALONE)
+                elif (len(voice_client.channel.members) == 1
+                      and not idle_timers.is_armed(member.guild.id, IdleVoiceTimers.ALONE)):
+                    # Jangan reset deadline timer yang sudah jalan
+                    idle_timers.arm(member.guild.id, IdleVoiceTimers.ALONE, VOICE_ALONE_TIMEOUT)
                     
     except Exception as e:
         print(f"Voice state update error: {e}")
 
+@bot.event
+async def on_guild_channel_create(channel):
+    invalidate_announce_channel(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    invalidate_announce_channel(channel.guild.id)
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    """Nama/posisi/overwrite channel berubah bisa mengubah announce channel"""
+    invalidate_announce_channel(after.guild.id)
+
+@bot.event
+async def on_guild_update(before, after):
+    if before.system_channel != after.system_channel:
+        invalidate_announce_channel(after.id)
+
+@bot.event
+async def on_guild_role_update(before, after):
+    """Permission role berubah (termasuk role bot) -> announce channel bisa berubah"""
+    invalidate_announce_channel(after.guild.id)
+
+@bot.event
+async def on_guild_role_delete(role):
+    invalidate_announce_channel(role.guild.id)
+
+@bot.event
+async def on_guild_remove(guild):
+    invalidate_announce_channel(guild.id)
+
 @bot.event
 async def on_message(message):
     """Handle auto-replies and command processing"""
@@ -1137,9 +3810,8 @@ async def on_message(message):
         return
 
     # Process bans first
-    cleanup_expired_timeouts()
-    data = load_bans()
-    if str(message.author.id) in data:
+    entry = ban_store.get(message.author.id)
+    if entry and not is_timeout_expired(entry):
         await bot.process_commands(message)
         return
 
@@ -1198,149 +3870,142 @@ async def play(ctx, *, query):
             await ctx.send(f"❌ Failed to connect to voice channel: {e}")
             return
 
-    status_msg = await ctx.send("🎧 Searching for the song, please wait...")
+    status_msg = await outbound.send(ctx.channel, "🎧 Searching for the song, please wait...")
     guild_player = get_guild_player(ctx)
 
     async with ctx.typing():
         try:
             if 'list=' in clean_query.lower() and ('youtube.com' in clean_query.lower() or 'youtu.be' in clean_query.lower()):
                 # Playlist handling - SUPPORT 1000+ SONGS
+                # Halaman pertama di-load dulu supaya lagu cepat mulai, sisanya di background
                 try:
-                    ytdl_playlist = youtube_dl.YoutubeDL({
-                        **ytdl_format_options,
-                        'extract_flat': True,
-                        'noplaylist': False,
-                        'quiet': True,
-                        'no_warnings': True,
-                    })
-
-                    playlist_data = await bot.loop.run_in_executor(
-                        None,
-                        lambda: ytdl_playlist.extract_info(clean_query, download=False)
+                    title, songs = await fetch_playlist_page(
+                        ctx.guild.id, clean_query, 1, PLAYLIST_FIRST_PAGE, ctx.author, status_msg
                     )
 
-                    if not playlist_data or 'entries' not in playlist_data:
-                        await status_msg.edit(content="❌ Couldn't process that playlist or playlist is empty")
-                        return
-
-                    # Process semua songs tanpa batasan 100
-                    songs = []
-                    total_entries = len(playlist_data['entries'])
-                    
-                    # Kirim status processing
-                    await status_msg.edit(content=f"🔄 Processing playlist... (0/{total_entries} songs)")
-                    
-                    for i, entry in enumerate(playlist_data['entries']):
-                        if entry:
-                            try:
-                                song = Song(entry, ctx.author)
-                                songs.append(song)
-                                
-                                # Update status setiap 50 songs agar tidak spam
-                                if i % 50 == 0:
-                                    await status_msg.edit(content=f"🔄 Processing playlist... ({i}/{total_entries} songs)")
-                                
-                                # Optional: Batas maksimal 1000 songs untuk prevent abuse
-                                if len(songs) >= 1000:
-                                    await ctx.send(f"⚠️ Playlist terlalu besar! Hanya mengambil 1000 lagu pertama.")
-                                    break
-                                    
-                            except Exception as e:
-                                print(f"Error processing playlist entry {i}: {e}")
-                                continue
-
                     if not songs:
-                        await status_msg.edit(content="❌ No valid songs found in playlist")
+                        await outbound.edit(status_msg, content="❌ Couldn't process that playlist or playlist is empty")
                         return
 
                     # Add songs to queue
-                    guild_player['playlist_mode'] = True
-                    for song in songs:
-                        guild_player['queue'].append(song)
-                    guild_player['playlist_mode'] = False
+                    guild_player.playlist_mode = True
+                    guild_player.queue.extend(songs)
+                    guild_player.playlist_mode = False
 
                     # Mainkan jika belum main
                     if not ctx.voice_client.is_playing() and not ctx.voice_client.is_paused():
                         await play_next(ctx)
+                    else:
+                        schedule_prefetch(ctx.guild.id)
 
-                    await status_msg.edit(content=f"🎵 Added {len(songs)} songs from playlist: **{playlist_data['title']}**")
+                    if len(songs) < PLAYLIST_FIRST_PAGE:
+                        await outbound.edit(status_msg, content=f"🎵 Added {len(songs)} songs from playlist: **{title}**")
+                    else:
+                        await outbound.edit(status_msg, content=f"🎵 Added {len(songs)} songs from playlist: **{title}** (loading more...)")
+                        # Dirantai ke load sebelumnya (bukan dibatalkan); reset() membatalkan seluruh rantai
+                        old_task = guild_player.playlist_task
+                        guild_player.playlist_task = bot.loop.create_task(load_playlist_remainder(
+                            ctx.guild.id, clean_query, ctx.author, status_msg, title, len(songs),
+                            previous=old_task if old_task and not old_task.done() else None
+                        ))
 
                 except Exception as e:
-                    await status_msg.edit(content=f"❌ Playlist error: {str(e)}")
+                    await outbound.edit(status_msg, content=f"❌ Playlist error: {str(e)}")
 
             else:
                 # Single song handling - PASTIKAN CONTEXT DITERUSKAN
                 try:
-                    with youtube_dl.YoutubeDL(ytdl_format_options) as ytdl_instance:
-                        if clean_query.startswith(('http://', 'https://')):
-                            data = await bot.loop.run_in_executor(
-                                None,
-                                lambda: ytdl_instance.extract_info(clean_query, download=False)
-                            )
-                        else:
-                            data = await bot.loop.run_in_executor(
-                                None,
-                                lambda: ytdl_instance.extract_info(f"ytsearch:{clean_query}", download=False)
-                            )
-
-                        if not data:
-                            await status_msg.edit(content="❌ No results found")
-                            return
+                    if clean_query.startswith(('http://', 'https://')):
+                        data = await search_youtube(clean_query, ctx.guild.id, status_msg)
+                    else:
+                        # Query teks lewat search cache persisten
+                        data = await cached_search(
+                            clean_query,
+                            lambda q: search_youtube(f"ytsearch:{q}", ctx.guild.id, status_msg),
+                            lambda q: search_youtube(f"ytsearch:{q}", ctx.guild.id)
+                        )
 
-                        if 'entries' in data:
-                            if not data['entries']:
-                                await status_msg.edit(content="❌ No results found")
-                                return
-                            data = data['entries'][0]
+                    if not data:
+                        await outbound.edit(status_msg, content="❌ No results found")
+                        return
 
-                        song = Song(data, ctx.author)
+                    song = Song(data, ctx.author)
 
-                        if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
-                            guild_player['queue'].append(song)
-                            embed = discord.Embed(
-                                description=f"🎵 Added to queue: [{song.title}]({song.url})",
-                                color=0x00ff00
-                            )
-                            embed.set_footer(text=f"Requested by {ctx.author.display_name}")
-                            await status_msg.edit(content=None, embed=embed)
+                    async with guild_player.lock:
+                        busy = (guild_player.state is not PlayerState.IDLE
+                                or ctx.voice_client.is_playing() or ctx.voice_client.is_paused())
+                        if busy:
+                            guild_player.queue.append(song)
+                            if len(guild_player.queue) <= PREFETCH_DEPTH:
+                                schedule_prefetch(ctx.guild.id)
                         else:
-                            guild_player['current_song'] = song
+                            guild_player.current_song = song
+                            guild_player.text_channel = ctx.channel
                             # ⭐⭐ PASTIKAN CONTEXT DITERUSKAN KE play_song ⭐⭐
                             await play_song(ctx.voice_client, song, ctx)
-                            embed = discord.Embed(
-                                description=f"🎶 Now playing: [{song.title}]({song.url})",
-                                color=0x00ff00
-                            )
-                            embed.set_footer(text=f"Requested by {ctx.author.display_name}")
-                            if song.thumbnail:
-                                embed.set_thumbnail(url=song.thumbnail)
-                            await status_msg.edit(content=None, embed=embed)
-
-                except Exception as e:
-                    await status_msg.edit(content=f"❌ Error processing song: {str(e)}")
-
-        except Exception as e:
-            await status_msg.edit(content=f"❌ Unexpected error: {str(e)}")
-
-@bot.command(aliases=['q'])
-async def queue(ctx, page: int = 1):
-    """Show current queue with navigation buttons"""
-    guild_player = get_guild_player(ctx)
-    
-    if not guild_player['queue'] and not guild_player['current_song']:
-        await ctx.send("ℹ️ The queue is empty!")
-        return
+                    
+                    if busy:
+                        embed = discord.Embed(
+                            description=f"🎵 Added to queue: [{song.title}]({song.url})",
+                            color=0x00ff00
+                        )
+                        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+                        await outbound.edit(status_msg, content=None, embed=embed)
+                    else:
+                        embed = discord.Embed(
+                            description=f"🎶 Now playing: [{song.title}]({song.url})",
+                            color=0x00ff00
+                        )
+                        embed.set_footer(text=f"Requested by {ctx.author.display_name}")
+                        if song.thumbnail:
+                            embed.set_thumbnail(url=song.thumbnail)
+                        await outbound.edit(status_msg, content=None, embed=embed)
 
-    # Tentukan jumlah item per halaman
-    items_per_page = 8  # Reduced from 10 to be safer
-    total_songs = len(guild_player['queue'])
-    total_pages = max(1, (total_songs + items_per_page - 1) // items_per_page)
-    
-    # Validasi nomor halaman
-    page = max(1, min(page, total_pages))
-    
-    # Fungsi untuk membuat embed berdasarkan halaman
-    def create_embed(page_num):
+                except Exception as e:
+                    await outbound.edit(status_msg, content=f"❌ Error processing song: {str(e)}")
+
+        except Exception as e:
+            await outbound.edit(status_msg, content=f"❌ Unexpected error: {str(e)}")
+
+class QueuePaginator(discord.ui.View):
+    """Paginator queue dengan tombol; embed per halaman di-render lazily dan di-cache per versi queue"""
+
+    ITEMS_PER_PAGE = 8  # Reduced from 10 to be safer
+
+    def __init__(self, ctx, guild_player, page=1, timeout=60):
+        super().__init__(timeout=timeout)
+        self.ctx = ctx
+        self.guild_player = guild_player
+        self.page = page
+        self.message = None
+        self.snapshot_key = None
+        self.pages = {}  # page -> embed untuk snapshot_key saat ini
+        self.total_pages = 1
+        self._refresh()
+
+    def _refresh(self):
+        """Buang cache halaman jika queue / now playing / status loop berubah"""
+        gp = self.guild_player
+        key = (id(gp.queue), gp.queue.version, id(gp.current_song), gp.loop, gp.loop_queue)
+        if key != self.snapshot_key:
+            self.snapshot_key = key
+            self.pages.clear()
+            self.total_pages = max(1, (len(gp.queue) + self.ITEMS_PER_PAGE - 1) // self.ITEMS_PER_PAGE)
+        self.page = max(1, min(self.page, self.total_pages))
+        self.previous_page.disabled = self.page <= 1
+        self.next_page.disabled = self.page >= self.total_pages
+
+    def render(self):
+        """Embed halaman sekarang (dari cache jika queue belum berubah)"""
+        self._refresh()
+        if self.page not in self.pages:
+            self.pages[self.page] = self._build_embed(self.page)
+        return self.pages[self.page]
+
+    def _build_embed(self, page_num):
+        guild_player = self.guild_player
+        ctx = self.ctx
+        total_songs = len(guild_player.queue)
         embed = discord.Embed(
             title="🎧 Music Queue",
             color=0x00ff00,
@@ -1348,50 +4013,45 @@ async def queue(ctx, page: int = 1):
         )
         
         # Tambahkan current song
-        if guild_player['current_song']:
-            current = guild_player['current_song']
+        if guild_player.current_song:
+            current = guild_player.current_song
             embed.add_field(
                 name="🎶 Now Playing",
                 value=(
                     f"[{current.title}]({current.url})\n"
                     f"⏳ {current.format_duration()} | "
-                    f"Requested by {current.requester.mention}"
+                    f"Requested by {current.requester_mention}"
                 ),
                 inline=False
             )
         
         # Tambahkan separator jika ada current song
-        if guild_player['current_song'] and guild_player['queue']:
+        if guild_player.current_song and guild_player.queue:
             embed.add_field(name="\u200b", value="──────────────", inline=False)
         
         # Tambahkan queue songs untuk halaman ini
-        if guild_player['queue']:
-            start = (page_num - 1) * items_per_page
-            end = min(start + items_per_page, total_songs)
+        if guild_player.queue:
+            start = (page_num - 1) * self.ITEMS_PER_PAGE
+            end = min(start + self.ITEMS_PER_PAGE, total_songs)
             
             queue_text = ""
-            for i in range(start, end):
-                song = guild_player['queue'][i]
-                position = i + 1
-                
-                # Format song entry dengan truncation yang aman
-                song_title = song.title
+            for position, song in enumerate(guild_player.queue[start:end], start + 1):
                 # Truncate title if too long
+                song_title = song.title
                 if len(song_title) > 60:
                     song_title = f"{song_title[:57]}..."
                 
                 # Build the entry
                 entry = f"`{position}.` [{song_title}]({song.url})\n"
-                entry += f"    ⏳ {song.format_duration()} | 👤 {song.requester.display_name}\n"
+                entry += f"    ⏳ {song.format_duration()} | 👤 {song.requester_name(ctx.guild)}\n"
                 
                 # Check if adding this entry would exceed the limit
                 if len(queue_text) + len(entry) > 1000:  # Leave some buffer
-                    queue_text += f"\n*... and {end - i} more songs*"
+                    queue_text += f"\n*... and {end - position + 1} more songs*"
                     break
                 
                 queue_text += entry
             
-            # Jika ada text, tambahkan ke embed
             if queue_text:
                 embed.add_field(
                     name=f"📜 Up Next (Songs {start+1}-{end} of {total_songs})",
@@ -1399,159 +4059,166 @@ async def queue(ctx, page: int = 1):
                     inline=False
                 )
         
-        # Tambahkan footer dengan status dan halaman
-        footer_text = f"Page {page_num}/{total_pages}"
-        
-        # Tambahkan status loop
+        # Footer dengan halaman dan status loop
+        footer_text = f"Page {page_num}/{self.total_pages}"
         status_parts = []
-        if guild_player['loop']:
+        if guild_player.loop:
             status_parts.append("🔂 Loop")
-        if guild_player['loop_queue']:
+        if guild_player.loop_queue:
             status_parts.append("🔁 Queue Loop")
-        
         if status_parts:
             footer_text += f" • {' | '.join(status_parts)}"
         
         embed.set_footer(text=footer_text)
         return embed
+
+    async def interaction_check(self, interaction):
+        if interaction.user != self.ctx.author:
+            await interaction.response.send_message("🚫 Hanya yang memanggil `n.queue` yang bisa ganti halaman", ephemeral=True)
+            return False
+        return True
+
+    async def _show(self, interaction, page):
+        self.page = page
+        embed = self.render()
+        # Satu REST call per klik
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+
+    @discord.ui.button(emoji="❌", style=discord.ButtonStyle.danger)
+    async def close(self, interaction, button):
+        self.stop()
+        await interaction.response.edit_message(view=None)
+
+    async def on_timeout(self):
+        if self.message:
+            outbound.edit(self.message, view=None)
+
+@bot.command(aliases=['q'])
+async def queue(ctx, page: int = 1):
+    """Show current queue with navigation buttons"""
+    guild_player = get_guild_player(ctx)
     
-    # Buat dan kirim embed awal
-    embed = create_embed(page)
-    message = await ctx.send(embed=embed)
-    
-    # Jika ada lebih dari 1 halaman, tambahkan buttons
-    if total_pages > 1:
-        # Tambahkan reactions/buttons
-        if page > 1:
-            await message.add_reaction("◀️")  # Previous
-        if page < total_pages:
-            await message.add_reaction("▶️")  # Next
-        await message.add_reaction("❌")  # Close/Stop
-        
-        # Fungsi untuk mengecek reaction
-        def check(reaction, user):
-            return (
-                user == ctx.author and
-                reaction.message.id == message.id and
-                str(reaction.emoji) in ["◀️", "▶️", "❌"]
-            )
-        
-        # Reaction handler
-        try:
-            while True:
-                reaction, user = await bot.wait_for('reaction_add', timeout=60.0, check=check)
-                
-                # Hapus reaction user
-                try:
-                    await message.remove_reaction(reaction.emoji, user)
-                except:
-                    pass
-                
-                # Handle reaction
-                if str(reaction.emoji) == "◀️" and page > 1:
-                    page -= 1
-                elif str(reaction.emoji) == "▶️" and page < total_pages:
-                    page += 1
-                elif str(reaction.emoji) == "❌":
-                    try:
-                        await message.clear_reactions()
-                    except:
-                        pass
-                    break
-                
-                # Update embed
-                new_embed = create_embed(page)
-                await message.edit(embed=new_embed)
-                
-                # Update reactions jika perlu
-                try:
-                    await message.clear_reactions()
-                    if page > 1:
-                        await message.add_reaction("◀️")
-                    if page < total_pages:
-                        await message.add_reaction("▶️")
-                    await message.add_reaction("❌")
-                except:
-                    pass
-        
-        except asyncio.TimeoutError:
-            # Hapus reactions setelah timeout
-            try:
-                await message.clear_reactions()
-            except:
-                pass
+    if not guild_player.queue and not guild_player.current_song:
+        await ctx.send("ℹ️ The queue is empty!")
+        return
+
+    paginator = QueuePaginator(ctx, guild_player, page)
+    embed = paginator.render()
+    if paginator.total_pages > 1:
+        paginator.message = await ctx.send(embed=embed, view=paginator)
+    else:
+        paginator.stop()
+        await ctx.send(embed=embed)
 
 @bot.command(aliases=['s'])
 async def skip(ctx):
     """Skip current song - FIXED VERSION"""
     voice_client = ctx.voice_client
-    if not voice_client or not voice_client.is_playing():
+    if not voice_client or not (voice_client.is_playing() or voice_client.is_paused()):
         await ctx.send("ℹ️ Nothing is currently playing!")
         return
     
     guild_player = get_guild_player(ctx)
-    guild_id = ctx.guild.id
     
-    print(f"⏭️ SKIP - Current: {guild_player['current_song'].title if guild_player['current_song'] else 'None'}")
+    print(f"⏭️ SKIP - Current: {guild_player.current_song.title if guild_player.current_song else 'None'}")
     
-    # Set skip flag
-    guild_player['skip_requested'] = True
+    # Stop current playback, after callback track ini yang lanjut ke play_next (tepat sekali)
+    guild_player.text_channel = ctx.channel
+    version = guild_player.state_version
+    effects_source = get_effects_source(voice_client)
+    if effects_source and voice_client.is_playing():
+        effects_source.fade_out(EFFECTS_SKIP_FADE)
+    else:
+        voice_client.stop()
+    
+    try:
+        # State masih PLAYING (track lama): tunggu transisi yang terjadi setelah stop
+        await guild_player.wait_for_state(PlayerState.PLAYING, PlayerState.IDLE, timeout=15, after=version)
+    except asyncio.TimeoutError:
+        pass
     
-    # Stop current playback
-    voice_client.stop()
+    await ctx.message.add_reaction("⏭️")
+
+@bot.command()
+async def seek(ctx, position: str):
+    """Seek current song ke posisi tertentu (detik atau mm:ss)"""
+    voice_client = ctx.voice_client
+    guild_player = get_guild_player(ctx)
+    song = guild_player.current_song
+    if not voice_client or not song or not (voice_client.is_playing() or voice_client.is_paused()):
+        await ctx.send("ℹ️ Nothing is currently playing!")
+        return
     
-    await asyncio.sleep(0.5)
+    try:
+        seconds = parse_timestamp(position)
+    except ValueError:
+        await ctx.send("🚫 Format posisi salah. Contoh: `n.seek 90` atau `n.seek 1:30`")
+        return
     
-    # Langsung panggil play_next
-    await play_next(ctx)
+    if song.duration and seconds >= song.duration:
+        await ctx.send(f"🚫 Posisi melebihi durasi lagu ({song.format_duration()})")
+        return
     
-    await ctx.message.add_reaction("⏭️")
+    async with guild_player.lock:
+        await play_song(voice_client, song, ctx, start_at=seconds)
+    await ctx.message.add_reaction("⏩")
 
 @bot.command()
 async def loop(ctx):
     """Toggle loop for current song"""
     guild_player = get_guild_player(ctx)
-    guild_player['loop'] = not guild_player['loop']
-    guild_player['loop_queue'] = False if guild_player['loop'] else guild_player['loop_queue']
-    await ctx.message.add_reaction("🔂" if guild_player['loop'] else "➡️")
+    guild_player.loop = not guild_player.loop
+    guild_player.loop_queue = False if guild_player.loop else guild_player.loop_queue
+    await ctx.message.add_reaction("🔂" if guild_player.loop else "➡️")
 
 @bot.command()
 async def loopqueue(ctx):
     """Toggle queue looping"""
     guild_player = get_guild_player(ctx)
-    guild_player['loop_queue'] = not guild_player['loop_queue']
-    guild_player['loop'] = False if guild_player['loop_queue'] else guild_player['loop']
-    await ctx.message.add_reaction("🔁" if guild_player['loop_queue'] else "➡️")
+    guild_player.loop_queue = not guild_player.loop_queue
+    guild_player.loop = False if guild_player.loop_queue else guild_player.loop
+    await ctx.message.add_reaction("🔁" if guild_player.loop_queue else "➡️")
 
 @bot.command(aliases=['rm'])
 async def remove(ctx, index: int):
     """Remove a song from queue"""
     guild_player = get_guild_player(ctx)
-    if not guild_player['queue']:
+    if not guild_player.queue:
         await ctx.send("ℹ️ The queue is empty!")
         return
     
-    if index < 1 or index > len(guild_player['queue']):
-        await ctx.send(f"🚫 Please provide a valid position (1-{len(guild_player['queue'])})")
+    if index < 1 or index > len(guild_player.queue):
+        await ctx.send(f"🚫 Please provide a valid position (1-{len(guild_player.queue)})")
         return
     
-    removed = guild_player['queue'].pop(index - 1)
+    removed = guild_player.queue.pop(index - 1)
     embed = discord.Embed(
         description=f"🗑️ Removed: [{removed.title}]({removed.url})",
         color=0x00ff00
     )
-    embed.set_footer(text=f"Was position {index} | Requested by {removed.requester.display_name}")
+    embed.set_footer(text=f"Was position {index} | Requested by {removed.requester_name(ctx.guild)}")
     await ctx.send(embed=embed)
 
 @bot.command(aliases=['c'])
 async def clear(ctx):
     """Clear the queue"""
     guild_player = get_guild_player(ctx)
-    if not guild_player['queue']:
+    loading = guild_player.playlist_task and not guild_player.playlist_task.done()
+    if not guild_player.queue and not loading:
         await ctx.send("ℹ️ The queue is already empty!")
         return
     
-    guild_player['queue'].clear()
+    # Queue object yang sama tetap dipakai, jadi load playlist di background harus dihentikan eksplisit
+    guild_player.cancel_playlist_load()
+    guild_player.queue.clear()
     await ctx.message.add_reaction("🧹")
 
 @bot.command(aliases=['vol'])
@@ -1559,41 +4226,90 @@ async def volume(ctx, volume: int = None):
     """Set volume (0-100)"""
     guild_player = get_guild_player(ctx)
     if volume is None:
-        await ctx.send(f"🔊 Current volume: {int(guild_player['volume'] * 100)}%")
+        await ctx.send(f"🔊 Current volume: {int(guild_player.volume * 100)}%")
         return
     
     if volume < 0 or volume > 100:
         await ctx.send("🚫 Volume must be between 0 and 100")
         return
     
-    guild_player['volume'] = volume / 100
-    if ctx.voice_client and ctx.voice_client.source:
-        ctx.voice_client.source.volume = guild_player['volume']
+    if volume != 100 and not NUMPY_AVAILABLE:
+        await ctx.send("🚫 Volume control butuh numpy (`pip install numpy`)")
+        return
+    
+    guild_player.volume = volume / 100
+    voice_client = ctx.voice_client
+    effects_source = get_effects_source(voice_client)
+    if effects_source:
+        # Stage efek sudah aktif, gain berubah langsung
+        effects_source.volume = guild_player.volume
+    elif voice_client and voice_client.is_playing() and effects_active(guild_player) and guild_player.current_song:
+        # Source masih Opus passthrough, mulai ulang di posisi sekarang lewat stage efek
+        async with guild_player.lock:
+            await play_song(voice_client, guild_player.current_song, ctx, start_at=guild_player.playback_position())
     
     await ctx.message.add_reaction("🔊")
 
+@bot.command(aliases=['norm'])
+async def normalize(ctx):
+    """Toggle normalisasi loudness antar lagu"""
+    guild_player = get_guild_player(ctx)
+    if not NUMPY_AVAILABLE:
+        await ctx.send("🚫 Normalisasi loudness butuh numpy (`pip install numpy`)")
+        return
+    
+    guild_player.normalize = not guild_player.normalize
+    source = get_effects_source(ctx.voice_client)
+    if source and guild_player.current_song:
+        source.track_gain = loudness_cache.get_gain(guild_player.current_song) if guild_player.normalize else 1.0
+    
+    await ctx.send(f"📏 Loudness normalization: {'on' if guild_player.normalize else 'off'}")
+
+@bot.command(aliases=['xfade'])
+async def crossfade(ctx, seconds: int = None):
+    """Set crossfade antar lagu dalam detik (0 = mati)"""
+    guild_player = get_guild_player(ctx)
+    if seconds is None:
+        status = f"{guild_player.crossfade}s" if guild_player.crossfade else "off"
+        await ctx.send(f"🔀 Crossfade: {status}")
+        return
+    
+    if not NUMPY_AVAILABLE:
+        await ctx.send("🚫 Crossfade butuh numpy (`pip install numpy`)")
+        return
+    
+    if seconds < 0 or seconds > CROSSFADE_MAX:
+        await ctx.send(f"🚫 Crossfade must be between 0 and {CROSSFADE_MAX} seconds")
+        return
+    
+    guild_player.crossfade = seconds
+    source = get_effects_source(ctx.voice_client)
+    if source and guild_player.current_song:
+        source.crossfade_at = get_crossfade_frame(guild_player, guild_player.current_song, guild_player.track_offset)
+    
+    await ctx.message.add_reaction("🔀")
+
 @bot.command()
 async def shuffle(ctx):
     """Shuffle the queue"""
     guild_player = get_guild_player(ctx)
-    if len(guild_player['queue']) < 2:
+    if len(guild_player.queue) < 2:
         await ctx.send("ℹ️ Need at least 2 songs in queue to shuffle!")
         return
     
-    import random
-    random.shuffle(guild_player['queue'])
+    guild_player.queue.shuffle()
     await ctx.message.add_reaction("🔀")
 
 @bot.command(aliases=['mv'])
 async def move(ctx, from_pos: int, to_pos: int):
     """Move song in queue"""
     guild_player = get_guild_player(ctx)
-    if len(guild_player['queue']) < 2:
+    if len(guild_player.queue) < 2:
         await ctx.send("ℹ️ Need at least 2 songs in queue to move!")
         return
     
-    if from_pos < 1 or from_pos > len(guild_player['queue']) or to_pos < 1 or to_pos > len(guild_player['queue']):
-        await ctx.send(f"🚫 Invalid positions (1-{len(guild_player['queue'])})")
+    if from_pos < 1 or from_pos > len(guild_player.queue) or to_pos < 1 or to_pos > len(guild_player.queue):
+        await ctx.send(f"🚫 Invalid positions (1-{len(guild_player.queue)})")
         return
     
     from_idx = from_pos - 1
@@ -1603,8 +4319,7 @@ async def move(ctx, from_pos: int, to_pos: int):
         await ctx.send("🚫 Positions are the same!")
         return
     
-    moved_song = guild_player['queue'].pop(from_idx)
-    guild_player['queue'].insert(to_idx, moved_song)
+    moved_song = guild_player.queue.move(from_idx, to_idx)
     
     embed = discord.Embed(
         description=f"↕️ Moved [{moved_song.title}]({moved_song.url}) from position {from_pos} to {to_pos}",
@@ -1621,11 +4336,11 @@ async def lyrics(ctx, *, song_name: str = None):
     
     if song_name is None:
         guild_player = get_guild_player(ctx)
-        if not guild_player['current_song']:
+        if not guild_player.current_song:
             await ctx.send("❌ No song is currently playing! Please specify a song name.")
             return
         
-        song_name = guild_player['current_song'].title
+        song_name = guild_player.current_song.title
         clean_name = song_name.split(' (Official')[0].split(' | ')[0].split(' [Audio]')[0]
         search_query = clean_name
     else:
@@ -1635,7 +4350,7 @@ async def lyrics(ctx, *, song_name: str = None):
     
     try:
         song = await bot.loop.run_in_executor(
-            None,
+            io_executor,
             lambda: genius.search_song(search_query)
         )
         
@@ -1688,19 +4403,15 @@ async def stop(ctx):
         await ctx.send("ℹ️ I'm not in a voice channel!")
         return
     
-    guild_player = get_guild_player(ctx)
     guild_id = ctx.guild.id
     
-    guild_player['queue'].clear()
-    guild_player['current_song'] = None
-    guild_player['loop'] = False
-    guild_player['loop_queue'] = False
+    # Reset dulu supaya after callback dari stop() tidak memutar lagu berikutnya
+    player.clear_guild(guild_id)
     
     if ctx.voice_client.is_playing() or ctx.voice_client.is_paused():
         ctx.voice_client.stop()
     
     await ctx.voice_client.disconnect()
-    player.clear_guild(guild_id)
     await ctx.message.add_reaction("🛑")
 
 # ============================
@@ -1724,6 +4435,40 @@ async def fb(ctx, url: str):
 async def ig(ctx, url: str):
     asyncio.create_task(download_media(ctx, url, 'ig'))
 
+@bot.command(name="jobs")
+async def jobs(ctx):
+    """Lihat job download yang sedang berjalan dan antri"""
+    running, waiting, history = download_jobs.get_jobs()
+    now = time.monotonic()
+
+    def describe(job):
+        url = job.url if len(job.url) <= 50 else job.url[:47] + "..."
+        requesters = f" • 👥 {len(job.messages)}" if len(job.messages) > 1 else ""
+        return f"`#{job.id}` **{job.mode}** <@{job.user_id}>{requesters}\n{url}"
+
+    embed = discord.Embed(title="📥 Download Jobs", color=0x00ff00)
+    embed.add_field(
+        name=f"⚙️ Running ({len(running)}/{download_jobs.max_workers})",
+        value="\n".join(f"{describe(job)} • {now - job.started_at:.0f}s" for job in running) or "Tidak ada",
+        inline=False
+    )
+    embed.add_field(
+        name=f"⏳ Queued ({len(waiting)})",
+        value="\n".join(f"{job.position}. {describe(job)}" for job in waiting[:10]) or "Tidak ada",
+        inline=False
+    )
+    if history:
+        embed.add_field(
+            name="🕘 Recent",
+            value="\n".join(
+                f"{'✅' if job.state == 'done' else '❌'} `#{job.id}` **{job.mode}** "
+                f"{job.finished_at - job.started_at:.0f}s • {now - job.finished_at:.0f}s ago"
+                for job in history[:5]
+            ),
+            inline=False
+        )
+    await ctx.send(embed=embed)
+
 @bot.command(name="ytthumbnail")
 async def ytthumbnail(ctx, url: str = None):
     """Get YouTube video thumbnail"""
@@ -1746,7 +4491,7 @@ async def ytthumbnail(ctx, url: str = None):
     ]
 
     thumbnail_url = None
-    async with aiohttp.ClientSession() as session:
+    async with http_client.session() as session:
         for res_url in resolutions:
             async with session.get(res_url) as resp:
                 if resp.status == 200:
@@ -1768,62 +4513,6 @@ async def ytthumbnail(ctx, url: str = None):
     await ctx.send(embed=embed)
     await ctx.send(f"🖼️ **Link download langsung:** {thumbnail_url}")
 
-@bot.command(name="twitter")
-async def download_twitter(ctx, url: str):
-    """Download video dari Twitter (X)"""
-    await ctx.send("🐦 Sedang memproses video Twitter...")
-
-    temp_filename = os.path.join(DOWNLOADS_PATH, "twitter_video.mp4")
-
-    if os.path.exists(temp_filename):
-        os.remove(temp_filename)
-
-    ydl_opts = {
-        "outtmpl": temp_filename,
-        "format": "mp4",
-        "quiet": True,
-        "no_warnings": True,
-        "merge_output_format": "mp4",
-    }
-
-    try:
-        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
-
-        file_size = os.path.getsize(temp_filename)
-        limit_bytes = 25 * 1024 * 1024
-
-        if file_size <= limit_bytes:
-            await ctx.send("✅ Video berhasil diunduh!", file=File(temp_filename))
-        else:
-            await ctx.send("⚠️ File terlalu besar, sedang diupload ke GoFile.io...")
-
-            server_info = requests.get("https://api.gofile.io/getServer").json()
-            if server_info["status"] != "ok":
-                await ctx.send("❌ Gagal ambil server GoFile.io.")
-                return
-
-            server = server_info["data"]["server"]
-
-            with open(temp_filename, "rb") as f:
-                response = requests.post(
-                    f"https://{server}.gofile.io/uploadFile",
-                    files={"file": f}
-                ).json()
-
-            if response["status"] == "ok":
-                download_link = response["data"]["downloadPage"]
-                await ctx.send(f"📦 Video terlalu besar, tapi sudah diupload!\n🔗 {download_link}")
-            else:
-                await ctx.send("❌ Gagal mengupload video ke GoFile.io.")
-
-    except Exception as e:
-        await ctx.send(f"❌ Gagal mendownload video Twitter: `{e}`")
-
-    finally:
-        if os.path.exists(temp_filename):
-            os.remove(temp_filename)
-
 @bot.command()
 async def togif(ctx):
     """Convert image/video menjadi GIF (versi improved)"""
@@ -2379,23 +5068,92 @@ async def top_karbit(ctx):
 # BAN SYSTEM FUNCTIONS
 # ============================
 
-BOT_BANS_FILE = "bot_bans.json"
+BOT_BANS_FILE = "bot_bans.json"  # Format lama, di-import sekali ke database
+BOT_BANS_DB_PATH = "bot_bans.db"
+
+class BanStore:
+    """Ban/timeout user di SQLite: tiap perubahan satu row, aman dipakai bersama semua cluster"""
+
+    COLUMNS = ("type", "by", "reason", "set_at", "until")
+
+    def __init__(self, path=BOT_BANS_DB_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bot_bans (
+                    user_id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    "by" TEXT,
+                    reason TEXT,
+                    set_at TEXT,
+                    until TEXT
+                )
+            """)
+            empty = conn.execute("SELECT COUNT(*) FROM bot_bans").fetchone()[0] == 0
+        if empty and os.path.exists(BOT_BANS_FILE):
+            self._import_json()
 
-def load_bans():
-    if not os.path.exists(BOT_BANS_FILE):
-        with open(BOT_BANS_FILE, "w") as f:
-            json.dump({}, f)
-        return {}
-    try:
-        with open(BOT_BANS_FILE, "r") as f:
-            content = f.read().strip()
-            return json.loads(content) if content else {}
-    except json.JSONDecodeError:
-        return {}
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
 
-def save_bans(data):
-    with open(BOT_BANS_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    def _import_json(self):
+        try:
+            with open(BOT_BANS_FILE, "r") as f:
+                content = f.read().strip()
+                data = json.loads(content) if content else {}
+        except (OSError, json.JSONDecodeError):
+            return
+        for uid, entry in data.items():
+            self.set(uid, entry)
+        print(f"🔒 Imported {len(data)} bot bans from {BOT_BANS_FILE}")
+
+    def _to_entry(self, row):
+        return {key: value for key, value in zip(self.COLUMNS, row) if value is not None}
+
+    def get(self, user_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT type, "by", reason, set_at, until FROM bot_bans WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+        return self._to_entry(row) if row else None
+
+    def all(self):
+        with self._connect() as conn:
+            rows = conn.execute('SELECT user_id, type, "by", reason, set_at, until FROM bot_bans').fetchall()
+        return {row[0]: self._to_entry(row[1:]) for row in rows}
+
+    def set(self, user_id, entry):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO bot_bans VALUES (?, ?, ?, ?, ?, ?)",
+                (str(user_id), *(entry.get(key) for key in self.COLUMNS))
+            )
+
+    def delete(self, user_id, entry=None):
+        """Hapus ban user; jika entry diberikan, hanya jika row masih entry yang sama (tidak menghapus ban baru)"""
+        with self._connect() as conn:
+            if entry is None:
+                cursor = conn.execute("DELETE FROM bot_bans WHERE user_id = ?", (str(user_id),))
+            else:
+                cursor = conn.execute(
+                    "DELETE FROM bot_bans WHERE user_id = ? AND type = ? AND set_at IS ?",
+                    (str(user_id), entry.get("type"), entry.get("set_at"))
+                )
+        return cursor.rowcount > 0
+
+    def delete_expired_timeouts(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                'SELECT user_id, type, "by", reason, set_at, until FROM bot_bans WHERE type = \'timeout\''
+            ).fetchall()
+        for row in rows:
+            entry = self._to_entry(row[1:])
+            if is_timeout_expired(entry):
+                self.delete(row[0], entry)
+
+ban_store = BanStore()
 
 def is_timeout_expired(entry):
     if not entry:
@@ -2412,22 +5170,13 @@ def is_timeout_expired(entry):
         return True
 
 def cleanup_expired_timeouts():
-    data = load_bans()
-    changed = False
-    for uid, entry in list(data.items()):
-        if entry.get("type") == "timeout" and is_timeout_expired(entry):
-            del data[uid]
-            changed = True
-    if changed:
-        save_bans(data)
+    ban_store.delete_expired_timeouts()
 
 @bot.check
 async def global_not_banned_check(ctx):
     """Global ban check for all commands"""
-    cleanup_expired_timeouts()
-    data = load_bans()
     user_id = str(ctx.author.id)
-    entry = data.get(user_id)
+    entry = ban_store.get(user_id)
     if not entry:
         return True
 
@@ -2437,8 +5186,7 @@ async def global_not_banned_check(ctx):
 
     if entry.get("type") == "timeout":
         if is_timeout_expired(entry):
-            del data[user_id]
-            save_bans(data)
+            ban_store.delete(user_id, entry)
             return True
         else:
             until = entry.get("until")
@@ -2451,28 +5199,21 @@ async def global_not_banned_check(ctx):
 @commands.has_permissions(administrator=True)
 async def bot_ban(ctx, member: discord.Member, *, reason: str = "Tidak disebutkan"):
     """Ban user from using bot"""
-    data = load_bans()
-    uid = str(member.id)
-    data[uid] = {
+    ban_store.set(member.id, {
         "type": "ban",
         "by": str(ctx.author.id),
         "reason": reason,
         "set_at": datetime.now(timezone.utc).isoformat()
-    }
-    save_bans(data)
+    })
     await ctx.send(f"🔒 {member.mention} sekarang diblokir dari memakai bot. Alasan: {reason}")
 
 @bot.command(name="botunban")
 @commands.has_permissions(administrator=True)
 async def bot_unban(ctx, member: discord.User):
     """Unban user from bot"""
-    data = load_bans()
-    uid = str(member.id)
-    if uid not in data:
+    if not ban_store.delete(member.id):
         await ctx.send(f"ℹ️ {member.mention} tidak ada di daftar blokir.")
         return
-    del data[uid]
-    save_bans(data)
     await ctx.send(f"✅ {member.mention} berhasil dihapus dari daftar blokir bot.")
 
 @bot.command(name="bottimeout")
@@ -2484,16 +5225,13 @@ async def bot_timeout(ctx, member: discord.Member, minutes: int, *, reason: str
         return
 
     until_dt = datetime.utcnow() + timedelta(minutes=minutes)
-    data = load_bans()
-    uid = str(member.id)
-    data[uid] = {
+    ban_store.set(member.id, {
         "type": "timeout",
         "by": str(ctx.author.id),
         "reason": reason,
         "set_at": datetime.utcnow().isoformat(),
         "until": until_dt.isoformat()
-    }
-    save_bans(data)
+    })
     await ctx.send(f"⏳ {member.mention} dibatasi akses bot sampai **{until_dt.isoformat()} UTC**. Alasan: {reason}")
 
 @bot.command(name="botbanlist")
@@ -2501,7 +5239,7 @@ async def bot_timeout(ctx, member: discord.Member, minutes: int, *, reason: str
 async def bot_ban_list(ctx):
     """Show bot ban list"""
     cleanup_expired_timeouts()
-    data = load_bans()
+    data = ban_store.all()
     if not data:
         await ctx.send("📭 Tidak ada user yang diblokir dari bot.")
         return
@@ -2542,6 +5280,9 @@ async def help(ctx, category: str = None):
             "commands": {
                 "play / p": "Play music from YouTube",
                 "skip / s": "Skip current song", 
+                "seek": "Seek current song (detik atau mm:ss)",
+                "crossfade / xfade": "Set crossfade antar lagu (0-12 detik)",
+                "normalize / norm": "Toggle normalisasi loudness antar lagu",
                 "queue / q": "Show music queue",
                 "loop": "Toggle loop current song",
                 "loopqueue": "Toggle queue looping",
@@ -2564,6 +5305,7 @@ async def help(ctx, category: str = None):
                 "fb": "Download Facebook video", 
                 "ig": "Download Instagram video",
                 "twitter": "Download Twitter/X video",
+                "jobs": "Show download job queue",
                 "ytthumbnail": "Get YouTube thumbnail",
                 "togif": "Convert image/video to GIF"
             }
@@ -2727,7 +5469,7 @@ class MALCommands(commands.Cog):
         
         try:
             url = f"{self.base_url}/seasons/now"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -2791,7 +5533,7 @@ class MALCommands(commands.Cog):
         try:
             # Search dengan limit lebih banyak untuk rekomendasi
             url = f"{self.base_url}/anime?q={query}&limit=5"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -2840,7 +5582,7 @@ class MALCommands(commands.Cog):
         
         try:
             url = f"{self.base_url}/top/anime"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -2896,7 +5638,7 @@ class MALCommands(commands.Cog):
         
         try:
             search_url = f"{self.base_url}/anime?q={query}&limit=1"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(search_url) as response:
                     if response.status != 200:
                         await ctx.send("❌ Gagal mencari anime")
@@ -2953,7 +5695,7 @@ class MALCommands(commands.Cog):
                 year += 1
             
             url = f"{self.base_url}/seasons/{year}/{next_season}"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -3007,7 +5749,7 @@ class MALCommands(commands.Cog):
         
         try:
             url = f"{self.base_url}/characters?q={query}&limit=10"  # Limit lebih banyak untuk akurasi
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -3080,7 +5822,7 @@ class MALCommands(commands.Cog):
             anime_origin = "Unknown"
             try:
                 char_id = char['mal_id']
-                async with aiohttp.ClientSession() as session:
+                async with http_client.session() as session:
                     detail_url = f"{self.base_url}/characters/{char_id}"
                     async with session.get(detail_url) as response:
                         if response.status == 200:
@@ -3107,7 +5849,7 @@ class MALCommands(commands.Cog):
         
         try:
             url = f"{self.base_url}/people?q={query}&limit=5"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -3178,7 +5920,7 @@ class MALCommands(commands.Cog):
         """Mencari karakter dengan info anime yang jelas"""
         try:
             url = f"{self.base_url}/characters?q={query}&limit=5"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status != 200:
                         return None, None
@@ -3374,7 +6116,7 @@ class MALCommands(commands.Cog):
         """Mengirim info karakter utama"""
         try:
             url = f"{self.base_url}/anime/{anime_id}/characters"
-            async with aiohttp.ClientSession() as session:
+            async with http_client.session() as session:
                 async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
@@ -3889,15 +6631,18 @@ class AutoRecoverySystem:
             return False
     
     async def recover_voice_connection(self, guild_id):
-        """Recover voice connection yang error"""
+        """Recover voice connection yang error, lalu lanjutkan lagu dari posisi terakhir"""
+        guild_player = get_guild_player_by_id(guild_id)
         try:
-            voice_client = None
-            for vc in self.bot.voice_clients:
-                if vc.guild.id == guild_id:
-                    voice_client = vc
-                    break
+            voice_client = get_voice_client(guild_id)
             
             if voice_client:
+                # Simpan posisi sebelum disconnect
+                resume_song = guild_player.current_song
+                resume_at = guild_player.playback_position()
+                guild_player.reconnecting = True
+                guild_player.track_token += 1  # Abaikan after callback dari koneksi lama
+                
                 # Disconnect dulu
                 if voice_client.is_connected():
                     await voice_client.disconnect()
@@ -3914,15 +6659,22 @@ class AutoRecoverySystem:
                             break
                     
                     if target_channel:
-                        await target_channel.connect()
+                        new_client = await target_channel.connect()
                         self.stats['voice_reconnects'] += 1
                         print(f"✅ Voice reconnected to {target_channel.name}")
+                        
+                        if resume_song:
+                            async with guild_player.lock:
+                                await play_song(new_client, resume_song, start_at=resume_at)
+                            print(f"⏯️ Resumed {resume_song.title} at {int(resume_at)}s")
                         return True
             
             return False
         except Exception as e:
             print(f"❌ Voice recovery error: {e}")
             return False
+        finally:
+            guild_player.reconnecting = False
     
     async def recover_playback(self, guild_id):
         """Recover playback yang stuck"""
@@ -3931,11 +6683,9 @@ class AutoRecoverySystem:
             player.clear_guild(guild_id)
             
             # Stop voice client jika ada
-            for vc in self.bot.voice_clients:
-                if vc.guild.id == guild_id:
-                    if vc.is_playing() or vc.is_paused():
-                        vc.stop()
-                    break
+            vc = get_voice_client(guild_id)
+            if vc and (vc.is_playing() or vc.is_paused()):
+                vc.stop()
             
             await asyncio.sleep(1)
             print(f"✅ Playback recovered for guild {guild_id}")
@@ -3983,6 +6733,8 @@ class AutoRecoverySystem:
                 'cachedir': False,
                 'force_generic_extractor': True,
             })
+            stream_cache.clear()
+            ytdl_pool.reset()
             print("✅ YTDL cache reset")
             return True
         except Exception as e:
@@ -4087,6 +6839,122 @@ async def on_command_error(ctx, error):
     except Exception as e:
         print(f"Error in error handler (ironic): {e}")
 
+# ============================
+# CLUSTER IPC
+# ============================
+
+class ClusterIPC:
+    """Request/response JSON antar proses cluster lewat Unix socket lokal"""
+
+    def __init__(self, cluster_id=CLUSTER_ID, count=CLUSTER_COUNT, socket_dir=None):
+        self.cluster_id = cluster_id
+        self.count = count
+        self.socket_dir = socket_dir
+        self.handlers = {}
+        self.server = None
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    def address(self, cluster_id):
+        return os.path.join(self.socket_dir or get_runtime_dir(), f"reika-cluster-{cluster_id}.sock")
+
+    def handler(self, op):
+        """Decorator: daftarkan coroutine untuk op"""
+        def register(func):
+            self.handlers[op] = func
+            return func
+        return register
+
+    async def start(self):
+        if not self.enabled or self.server:
+            return
+        path = self.address(self.cluster_id)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server = await asyncio.start_unix_server(self._serve, path=path)
+        print(f"🌐 Cluster {self.cluster_id}/{self.count} IPC listening on {path}")
+
+    async def _serve(self, reader, writer):
+        try:
+            request = json.loads(await reader.readline())
+            handler = self.handlers.get(request.get('op'))
+            result = await handler(**request.get('args', {})) if handler else {'error': 'unknown op'}
+            writer.write(json.dumps(result).encode() + b'\n')
+            await writer.drain()
+        except Exception as e:
+            print(f"⚠️ Cluster IPC error: {e}")
+        finally:
+            writer.close()
+
+    async def request(self, cluster_id, op, timeout=3, **args):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_unix_connection(self.address(cluster_id)), timeout
+        )
+        try:
+            writer.write(json.dumps({'op': op, 'args': args}).encode() + b'\n')
+            await writer.drain()
+            return json.loads(await asyncio.wait_for(reader.readline(), timeout))
+        finally:
+            writer.close()
+
+    async def gather(self, op, **args):
+        """Jalankan op di semua cluster (termasuk proses ini), None untuk cluster yang tidak merespon"""
+        async def ask(cluster_id):
+            if cluster_id == self.cluster_id:
+                return await self.handlers[op](**args)
+            try:
+                return await self.request(cluster_id, op, **args)
+            except (OSError, asyncio.TimeoutError, ValueError):
+                return None
+        return await asyncio.gather(*(ask(cluster_id) for cluster_id in range(self.count)))
+
+cluster_ipc = ClusterIPC()
+
+@cluster_ipc.handler('stats')
+async def cluster_stats():
+    """Ringkasan status proses ini untuk n.system di cluster lain"""
+    return {
+        'cluster': CLUSTER_ID,
+        'shards': SHARD_IDS,
+        'guilds': len(bot.guilds),
+        'voice_clients': len(bot.voice_clients),
+        'playing': sum(1 for vc in bot.voice_clients if vc.is_playing()),
+        'players': len(player.players),
+        'memory_mb': psutil.Process().memory_info().rss / 1024 / 1024,
+        'latency_ms': round(bot.latency * 1000),
+    }
+
+def run_cluster_launcher():
+    """Jalankan REIKA_CLUSTERS proses bot (masing-masing satu range shard), restart yang crash"""
+    # Semua cluster instance ini berbagi satu direktori runtime untuk socket IPC
+    env = dict(os.environ, REIKA_SHARD_COUNT=str(SHARD_COUNT or CLUSTER_COUNT), REIKA_RUNTIME_DIR=get_runtime_dir())
+
+    def spawn(cluster_id):
+        return subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__)],
+            env=dict(env, REIKA_CLUSTER_ID=str(cluster_id))
+        )
+
+    processes = {}
+    for cluster_id in range(CLUSTER_COUNT):
+        processes[cluster_id] = spawn(cluster_id)
+        time.sleep(5)  # Jeda IDENTIFY antar cluster
+    print(f"🌐 Launched {CLUSTER_COUNT} clusters, {env['REIKA_SHARD_COUNT']} shards")
+    try:
+        while True:
+            time.sleep(5)
+            for cluster_id, process in list(processes.items()):
+                if process.poll() is not None:
+                    print(f"⚠️ Cluster {cluster_id} exited ({process.returncode}), restarting")
+                    processes[cluster_id] = spawn(cluster_id)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes.values():
+            process.terminate()
+
 # ============================
 # SYSTEM MONITORING COMMANDS
 # ============================
@@ -4122,6 +6990,123 @@ async def system_status(ctx):
         # Player stats
         embed.add_field(name="🎵 Active Players", value=str(len(player.players)), inline=True)
         
+        # Cluster totals
+        if SHARD_COUNT:
+            embed.add_field(name="🧩 Shards", value=f"{', '.join(map(str, SHARD_IDS))} / {SHARD_COUNT}", inline=True)
+        if cluster_ipc.enabled:
+            results = await cluster_ipc.gather('stats')
+            alive = [r for r in results if r]
+            cluster_lines = [
+                f"#{r['cluster']}: {r['guilds']} servers • {r['playing']}/{r['voice_clients']} playing • {r['memory_mb']:.0f} MB • {r['latency_ms']}ms"
+                for r in alive
+            ]
+            embed.add_field(
+                name=f"🌐 Cluster ({len(alive)}/{cluster_ipc.count} up)",
+                value=(
+                    f"**Total:** {sum(r['guilds'] for r in alive)} servers • "
+                    f"{sum(r['voice_clients'] for r in alive)} voice • {sum(r['playing'] for r in alive)} playing\n"
+                    + "\n".join(cluster_lines)
+                )[:1024],
+                inline=False
+            )
+        
+        # Stream cache stats
+        cache_stats = stream_cache.get_stats()
+        embed.add_field(
+            name="⚡ Stream Cache",
+            value=f"{cache_stats['hits']} hit / {cache_stats['misses']} miss ({cache_stats['hit_rate']:.0f}%) • {cache_stats['entries']} entries",
+            inline=False
+        )
+        
+        # Search cache stats
+        search_stats = search_cache.get_stats()
+        embed.add_field(
+            name="🔍 Search Cache",
+            value=f"{search_stats['hits']} hit / {search_stats['stale_hits']} stale / {search_stats['misses']} miss ({search_stats['hit_rate']:.0f}%) • {search_stats['entries']} queries",
+            inline=False
+        )
+        
+        # Audio file cache stats
+        audio_stats = audio_cache.get_stats()
+        embed.add_field(
+            name="💽 Audio Cache",
+            value=f"{audio_stats['hits']} hit / {audio_stats['misses']} miss ({audio_stats['hit_rate']:.0f}%) • {audio_stats['entries']} files • {audio_stats['bytes'] / 1024 / 1024:.0f}/{AUDIO_CACHE_MAX_BYTES // 1024 // 1024} MB",
+            inline=False
+        )
+        
+        # YTDL pool stats
+        pool_stats = ytdl_pool.get_stats()
+        if pool_stats:
+            pool_lines = [
+                f"{name}: {st['instances']} inst • wait avg {st['avg_wait']*1000:.0f}ms / max {st['max_wait']*1000:.0f}ms"
+                for name, st in pool_stats.items()
+            ]
+            embed.add_field(name="🧰 YTDL Pool", value="\n".join(pool_lines)[:1024], inline=False)
+        
+        # Media executor stats
+        media_stats = media_scheduler.get_stats()
+        embed.add_field(
+            name="🧵 Media Executor",
+            value=f"{media_stats['running']}/{MEDIA_EXECUTOR_WORKERS} running • {media_stats['waiting']} waiting • {media_stats['rejected']} rejected",
+            inline=False
+        )
+        
+        job_stats = download_jobs.get_stats()
+        embed.add_field(
+            name="📥 Download Jobs",
+            value=(
+                f"{job_stats['running']}/{DOWNLOAD_WORKERS} running • {job_stats['waiting']} waiting • "
+                f"{job_stats['completed']} done / {job_stats['failed']} failed • "
+                f"{job_stats['deduplicated']} deduplicated • {job_stats['rejected']} rejected"
+            ),
+            inline=False
+        )
+        
+        outbound_stats = outbound.get_stats()
+        embed.add_field(
+            name="📮 Outbound Messages",
+            value=(
+                f"{outbound_stats['depth']} queued in {outbound_stats['channels']} channels • "
+                f"wait avg {outbound_stats['avg_wait']*1000:.0f}ms / max {outbound_stats['max_wait']*1000:.0f}ms • "
+                f"{outbound_stats['coalesced']} coalesced • {outbound_stats['superseded']} superseded"
+            ),
+            inline=False
+        )
+        
+        loudness_stats = loudness_cache.get_stats()
+        embed.add_field(
+            name="📏 Loudness",
+            value=f"{loudness_stats['measured']} measured • {loudness_stats['pending']} pending • {loudness_stats['failed']} failed",
+            inline=False
+        )
+        
+        if audio_nodes.enabled:
+            node_stats = audio_nodes.get_stats()
+            embed.add_field(
+                name="🎛️ Audio Nodes",
+                value=f"{node_stats['alive']}/{node_stats['nodes']} alive • {node_stats['streams']} streams • {node_stats['restarts']} restarts",
+                inline=False
+            )
+        
+        timer_stats = idle_timers.get_stats()
+        embed.add_field(
+            name="💤 Idle Timers",
+            value=f"{timer_stats['armed']} armed • {timer_stats['idle_disconnects']} idle / {timer_stats['alone_disconnects']} alone disconnects",
+            inline=False
+        )
+        
+        http_stats = sorted(http_client.get_stats().items(), key=lambda item: -item[1]['requests'])[:4]
+        if http_stats:
+            embed.add_field(
+                name="🌐 HTTP",
+                value="\n".join(
+                    f"`{host}` {stats['requests']} req • {stats['errors']} err • {stats['retries']} retry • "
+                    f"avg {stats['avg_latency']*1000:.0f}ms / max {stats['max_latency']*1000:.0f}ms"
+                    for host, stats in http_stats
+                ),
+                inline=False
+            )
+        
         # Recovery stats
         if recovery:
             stats = recovery.get_stats()
@@ -4160,7 +7145,7 @@ async def system_cleanup(ctx):
         # Clear player cache untuk guild yang tidak aktif
         inactive_guilds = []
         for guild_id in list(player.players.keys()):
-            voice_active = any(vc.guild.id == guild_id for vc in bot.voice_clients)
+            voice_active = get_voice_client(guild_id) is not None
             if not voice_active:
                 inactive_guilds.append(guild_id)
         
@@ -4240,28 +7225,161 @@ ytdl_format_options.update({
 })
 
 # Cache untuk search queries (reduces API calls)
-search_cache = {}
-CACHE_TIMEOUT = 300  # 5 menit
+SEARCH_CACHE_DB_PATH = SNAPSHOT_DB_PATH
+SEARCH_CACHE_TTL = 6 * 3600  # Hasil dianggap fresh selama 6 jam
+SEARCH_CACHE_STALE_TTL = 7 * 86400  # Setelah itu masih dipakai (sambil refresh) sampai 7 hari
+SEARCH_CACHE_MAX_ENTRIES = 5000
+
+SEARCH_NOISE_PATTERN = re.compile(
+    r"\b(official\s+(music\s+|lyrics?\s+)?video|official\s+audio|official\s+mv|music\s+video|"
+    r"lyrics?\s+video|lyrics?|lirik|audio\s+only|hd|hq)\b"
+)
+
+def normalize_search_query(query):
+    """Key cache: case-fold, buang tanda baca & kata noise, rapikan spasi"""
+    key = query.casefold()
+    key = re.sub(r"[^\w\s]", " ", key)
+    key = SEARCH_NOISE_PATTERN.sub(" ", key)
+    return " ".join(key.split())
+
+class SearchCache:
+    """Index persisten query teks -> hasil search, dengan TTL dan stale-while-revalidate"""
+
+    def __init__(self, path=SEARCH_CACHE_DB_PATH, max_entries=SEARCH_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (fetched_at, entry), urutan LRU
+        self.refreshing = {}
+        self._write_lock = None  # asyncio.Lock: satu penulis, urutan tulis sama dengan urutan perubahan
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    query_key TEXT PRIMARY KEY,
+                    title TEXT,
+                    webpage_url TEXT NOT NULL,
+                    duration INTEGER,
+                    thumbnail TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            rows = conn.execute(
+                "SELECT query_key, title, webpage_url, duration, thumbnail, fetched_at "
+                "FROM search_cache ORDER BY fetched_at"
+            ).fetchall()
+        for key, title, webpage_url, duration, thumbnail, fetched_at in rows:
+            self.entries[key] = (fetched_at, {
+                'title': title, 'url': webpage_url, 'webpage_url': webpage_url,
+                'duration': duration, 'thumbnail': thumbnail,
+            })
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def get(self, key):
+        """Return (entry, fresh) atau (None, False)"""
+        cached = self.entries.get(key)
+        if cached is None:
+            self.misses += 1
+            return None, False
+        fetched_at, entry = cached
+        age = time.time() - fetched_at
+        if age > SEARCH_CACHE_STALE_TTL:
+            self.misses += 1
+            return None, False
+        self.entries.move_to_end(key)
+        if age > SEARCH_CACHE_TTL:
+            self.stale_hits += 1
+            return entry, False
+        self.hits += 1
+        return entry, True
+
+    async def put(self, key, data):
+        webpage_url = data.get('webpage_url') or data.get('url')
+        if not key or not webpage_url:
+            return
+        fetched_at = time.time()
+        entry = {
+            'title': data.get('title'),
+            'url': webpage_url,
+            'webpage_url': webpage_url,
+            'duration': int(data.get('duration') or 0),
+            'thumbnail': data.get('thumbnail'),
+        }
+        self.entries[key] = (fetched_at, entry)
+        self.entries.move_to_end(key)
+
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append((self.entries.popitem(last=False)[0],))
+        row = (key, entry['title'], webpage_url, entry['duration'], entry['thumbnail'], fetched_at)
+        await self._persist([row], evicted)
+
+    async def _persist(self, rows, deletes):
+        """Tulis ke SQLite di io_executor, serial lewat satu lock; error di-log, tidak dibuang diam-diam"""
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        async with self._write_lock:
+            try:
+                await bot.loop.run_in_executor(io_executor, self._write, rows, deletes)
+            except Exception as e:
+                print(f"⚠️ Search cache write failed: {e}")
+
+    def _write(self, rows, deletes):
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO search_cache VALUES (?, ?, ?, ?, ?, ?)", rows)
+            conn.executemany("DELETE FROM search_cache WHERE query_key = ?", deletes)
+
+    async def prune(self):
+        """Buang entry yang sudah lewat stale window"""
+        cutoff = time.time() - SEARCH_CACHE_STALE_TTL
+        expired = [(key,) for key, (fetched_at, _) in self.entries.items() if fetched_at < cutoff]
+        for (key,) in expired:
+            del self.entries[key]
+        if expired:
+            await self._persist([], expired)
+        return len(expired)
+
+    def get_stats(self):
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'hit_rate': ((self.hits + self.stale_hits) / total * 100) if total else 0.0,
+        }
+
+search_cache = SearchCache()
 
-async def cached_search(query, search_func):
-    """Cached search untuk mengurangi API calls"""
-    cache_key = query.lower()
+async def cached_search(query, search_func, refresh_func=None):
+    """Cached search untuk mengurangi API calls (stale-while-revalidate)"""
+    cache_key = normalize_search_query(query) or query.casefold().strip()
+    entry, fresh = search_cache.get(cache_key)
+    if entry and fresh:
+        return entry
     
-    if cache_key in search_cache:
-        timestamp, data = search_cache[cache_key]
-        if time.time() - timestamp < CACHE_TIMEOUT:
-            return data
+    if entry:
+        # Pakai hasil lama sekarang, refresh di background (sekali per key)
+        if cache_key not in search_cache.refreshing:
+            async def refresh():
+                try:
+                    data = await (refresh_func or search_func)(query)
+                    if data:
+                        await search_cache.put(cache_key, data)
+                except Exception as e:
+                    print(f"⚠️ Search refresh failed for '{query}': {e}")
+                finally:
+                    search_cache.refreshing.pop(cache_key, None)
+            search_cache.refreshing[cache_key] = bot.loop.create_task(refresh())
+        return entry
     
     # Jika tidak ada di cache atau expired
     data = await search_func(query)
-    search_cache[cache_key] = (time.time(), data)
-    
-    # Cleanup cache lama
-    current_time = time.time()
-    expired_keys = [k for k, (t, _) in search_cache.items() if current_time - t > CACHE_TIMEOUT]
-    for key in expired_keys:
-        del search_cache[key]
-    
+    if data:
+        await search_cache.put(cache_key, data)
     return data
 
 # ============================
@@ -4315,9 +7433,8 @@ async def periodic_maintenance():
     
     while not bot.is_closed():
         try:
-            # Cleanup cache setiap 30 menit
-            if 'search_cache' in globals():
-                search_cache.clear()
+            # Buang hasil search yang sudah terlalu lama
+            await search_cache.prune()
             
             # Cleanup downloads folder setiap jam
             if os.path.exists(DOWNLOADS_PATH):
@@ -4331,16 +7448,6 @@ async def periodic_maintenance():
                     except:
                         pass
             
-            # Auto-disconnect dari voice yang idle > 30 menit
-            for vc in bot.voice_clients:
-                if vc.is_connected() and not vc.is_playing() and not vc.is_paused():
-                    guild_id = vc.guild.id
-                    guild_player = get_guild_player_by_id(guild_id)
-                    # Jika queue kosong dan sendirian di channel
-                    if not guild_player['queue'] and len(vc.channel.members) == 1:
-                        await vc.disconnect()
-                        player.clear_guild(guild_id)
-            
             # Memory cleanup jika tinggi
             try:
                 import psutil
@@ -4401,6 +7508,18 @@ async def on_ready():
     bot.loop.create_task(periodic_maintenance())
     print("✅ Background maintenance task started!")
     
+    # IPC antar cluster (n.system totals)
+    await cluster_ipc.start()
+    
+    # Resume queue dari snapshot sebelum restart (di background, connect voice bisa lambat), lalu snapshot berkala
+    if not queue_snapshots.restored:
+        async def restore_then_snapshot():
+            await queue_snapshots.restore()
+            await periodic_queue_snapshot()
+        bot.loop.create_task(restore_then_snapshot())
+    if SHARD_COUNT:
+        print(f"🧩 Cluster {CLUSTER_ID}: shards {SHARD_IDS} of {SHARD_COUNT}")
+    
     print(f"🚀 Bot ready and operational!")
 
 # ============================
@@ -4427,4 +7546,17 @@ async def main():
 # ============================
 
 if __name__ == "__main__":
-    bot.run(BOT_TOKEN)
\ No newline at end of file
+    if CLUSTER_COUNT > 1 and 'REIKA_CLUSTER_ID' not in os.environ:
+        try:
+            run_cluster_launcher()
+        finally:
+            cleanup_runtime_dir()
+        sys.exit(0)
+    
+    audio_nodes.start()
+    try:
+        bot.run(BOT_TOKEN)
+    finally:
+        shutdown_executors()
+        audio_nodes.shutdown()
+        cleanup_runtime_dir()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("discord")
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def bot_module(tmp_path_factory):
+    """Import bot.py dari direktori sementara (bot.py membuat folder/database di cwd saat import)"""
+    workdir = tmp_path_factory.mktemp("reika")
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.chdir(workdir)
+    monkeypatch.syspath_prepend(str(REPO_ROOT))
+    if importlib.util.find_spec("config") is None:
+        # config.py berisi token dan tidak ada di repo
+        monkeypatch.setitem(sys.modules, "config", types.SimpleNamespace(BOT_TOKEN="", PREFIX="n.", GENIUS_API_KEY=""))
+    try:
+        yield importlib.import_module("bot")
+    finally:
+        monkeypatch.undo()
+
+
+class SineSource:
+    """PCM stereo 48kHz: sinus amplitudo tetap, frame 20ms"""
+
+    def __init__(self, amplitude, frames, frequency=440):
+        self.amplitude = amplitude
+        self.frames = frames
+        self.frequency = frequency
+        self.position = 0
+
+    def read(self):
+        if self.frames <= 0:
+            return b''
+        self.frames -= 1
+        t = (self.position + np.arange(960)) / 48000
+        self.position += 960
+        wave = (np.sin(2 * np.pi * self.frequency * t) * self.amplitude * 32767).astype(np.int16)
+        return np.repeat(wave, 2).tobytes()
+
+    def cleanup(self):
+        pass
+
+
+def frame_peaks(source, count):
+    peaks = []
+    for _ in range(count):
+        data = source.read()
+        if not data:
+            break
+        peaks.append(int(np.abs(np.frombuffer(data, dtype=np.int16)).max()))
+    return peaks
+
+
+def test_crossfade_between_different_gains_has_no_level_jump(bot_module):
+    handoffs = []
+    source = bot_module.PCMEffectsAudio(
+        SineSource(0.4, 200), track_gain=0.5, fade_in=0,
+        on_handoff=lambda song, elapsed: handoffs.append(song),
+    )
+    frame_peaks(source, 10)
+    source.crossfade_into(SineSource(0.3, 200), "next", seconds=0.2, track_gain=2.0)
+    peaks = frame_peaks(source, 40)
+
+    assert handoffs == ["next"]
+    assert source.track_gain == 2.0
+    # Level akhir = 0.3 * 2.0 = 0.6, di bawah threshold limiter
+    assert abs(peaks[-1] - 0.6 * 32767) < 0.02 * 32767
+    # Tidak ada lonjakan di frame handoff (equal-power mix dua sinyal sefase boleh sedikit di atas level akhir)
+    assert max(peaks) <= peaks[-1] * 1.1
+    steps = [abs(b - a) for a, b in zip(peaks, peaks[1:])]
+    assert max(steps) < 0.15 * 32767